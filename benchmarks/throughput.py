@@ -0,0 +1,245 @@
+#! /usr/bin/env python3
+"""Command throughput and latency benchmarks, against the GC-100 simulator.
+
+Each workload is run against a simulated GC-100 (gc_100.simulator), running on its
+own thread (and event loop), so that the CPU time reported is the client's alone.
+For each workload this reports:
+* ops/sec: commands (or serial writes) per second
+* p50/p95/p99: latency per command, in milliseconds
+* connections: command port connections made (per command)
+* CPU: client CPU time per command, in microseconds
+
+Use '--json' for machine-readable results (e.g., to compare releases).
+"""
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import threading
+import time
+
+import gc_100
+from gc_100.simulator import Simulator
+
+parser = argparse.ArgumentParser(description="Benchmark pygc100 against a simulated GC-100")
+parser.add_argument('--host', default='127.0.0.2',
+                    help="loopback address for the simulator (default = 127.0.0.2)")
+parser.add_argument('--count', type=int, default=200,
+                    help="commands per workload (default = 200)")
+parser.add_argument('--mode', choices=['ephemeral', 'persistent', 'both'], default='both',
+                    help="GC100 connection mode(s) to benchmark (default = both)")
+parser.add_argument('--workload', action='append', default=None,
+                    help="run only this workload (may be repeated)")
+parser.add_argument('--latency', type=float, default=0.0,
+                    help="simulated GC-100 response latency, in seconds")
+parser.add_argument('--ir-time', type=float, default=0.002,
+                    help="simulated IR transmit time, in seconds (default = 0.002)")
+parser.add_argument('--json', action='store_true',
+                    help="write results as JSON (to stdout, or --output)")
+parser.add_argument('--output', default=None,
+                    help="write results to this file")
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def timed(latencies, coro):
+    t_start = time.perf_counter()
+    result = await coro
+    latencies.append(time.perf_counter() - t_start)
+    return result
+
+
+# Workloads.  Each runs 'count' operations, and returns the latency of each.
+
+async def relay_toggle(gc, count):
+    relay = gc_100.Relay(gc, '5:1')
+    latencies = []
+    for i in range(count):
+        await timed(latencies, relay.setstate(i % 2))
+    return latencies
+
+
+async def getdevices(gc, count):
+    latencies = []
+    for i in range(count):
+        await timed(latencies, gc.getdevices())
+    return latencies
+
+
+async def ir_burst(gc, count):
+    tv = gc_100.IR_out(gc, '3:1')
+    code = tv.format_sendir(freq=38000, code='50,100,12,12,12,24,12,24,12,600', count=3, offset=3)
+    latencies = []
+    for i in range(count):
+        await timed(latencies, tv.sendir_raw(code))
+    return latencies
+
+
+async def multi_connector(gc, count):
+    """IR on two ports, relays, and a sensor, all at once."""
+    irs = [gc_100.IR_out(gc, '3:1'), gc_100.IR_out(gc, '4:1')]
+    relays = [gc_100.Relay(gc, '5:1'), gc_100.Relay(gc, '5:2')]
+    sensor = gc_100.Digital_In(gc, '3:3')
+    latencies = []
+
+    async def stream(make, n):
+        for i in range(n):
+            await timed(latencies, make(i))
+
+    share = count // 5
+    await asyncio.gather(
+        stream(lambda i: irs[0].sendir(freq=38000, code='12,12,12,600'), share),
+        stream(lambda i: irs[1].sendir(freq=38000, code='12,12,12,600'), share),
+        stream(lambda i: relays[0].setstate(i % 2), share),
+        stream(lambda i: relays[1].setstate(i % 2), share),
+        stream(lambda i: sensor.getstate(), count - 4 * share))
+    return latencies
+
+
+async def serial_stream(gc, count):
+    """Send (and receive the echo of) 64-byte messages; paced at 57600 baud."""
+    serial = gc_100.Serial(gc, '1:1', 0)
+    await serial.connect()
+    await serial.set_SERIAL(57600, False, 'PARITY_NO')
+    chunk = b'x' * 64
+    received = 0
+
+    async def drain_echo():
+        nonlocal received
+        while received < count * len(chunk):
+            data = await serial.recv(4096)
+            if not data:
+                break
+            received += len(data)
+
+    async def send(data):
+        await serial.send(data)
+        await serial.flush()
+
+    reader = asyncio.create_task(drain_echo())
+    latencies = []
+    try:
+        for i in range(count):
+            # ('send()' only queues the data)
+            await timed(latencies, send(chunk))
+        await asyncio.wait_for(reader, 10)
+    finally:
+        reader.cancel()
+        await serial.disconnect()
+    return latencies
+
+
+WORKLOADS = {
+    'relay_toggle': relay_toggle,
+    'getdevices': getdevices,
+    'ir_burst': ir_burst,
+    'multi_connector': multi_connector,
+    'serial_stream': serial_stream,
+}
+
+
+class SimulatorThread:
+    """Run the simulator on its own thread and event loop."""
+
+    def __init__(self, **kwargs):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self.sim = self.call(self._create(**kwargs))
+
+    async def _create(self, **kwargs):
+        sim = Simulator(**kwargs)
+        await sim.start()
+        return sim
+
+    def call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def stop(self):
+        self.call(self.sim.stop())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+def run(sim, name, persistent, count):
+    async def go():
+        gc = gc_100.GC100(sim.host, sim.port, persistent=persistent)
+        try:
+            return await WORKLOADS[name](gc, count)
+        finally:
+            await gc.close()
+
+    connections = sim.connections
+    cpu_start = time.thread_time()
+    t_start = time.perf_counter()
+    latencies = asyncio.run(go())
+    elapsed = time.perf_counter() - t_start
+    cpu = time.thread_time() - cpu_start
+    connections = sim.connections - connections
+    ops = len(latencies)
+    return {
+        'workload': name,
+        'mode': 'persistent' if persistent else 'ephemeral',
+        'ops': ops,
+        'seconds': elapsed,
+        'ops_per_sec': ops / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'connections': connections,
+        'connections_per_op': connections / ops,
+        'cpu_us_per_op': cpu / ops * 1e6,
+    }
+
+
+def main():
+    args = parser.parse_args()
+    workloads = args.workload or list(WORKLOADS)
+    modes = {'ephemeral': [False], 'persistent': [True], 'both': [False, True]}[args.mode]
+
+    server = SimulatorThread(host=args.host, port=0, modes={'3:3': 'SENSOR'},
+                             latency=args.latency, ir_time=args.ir_time)
+    results = []
+    try:
+        for name in workloads:
+            for persistent in modes:
+                results.append(run(server.sim, name, persistent, args.count))
+    finally:
+        server.stop()
+
+    if args.json:
+        report = {
+            'pygc100': gc_100.__version__ if hasattr(gc_100, '__version__') else None,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'count': args.count,
+            'latency': args.latency,
+            'ir_time': args.ir_time,
+            'results': results,
+        }
+        text = json.dumps(report, indent=2)
+    else:
+        lines = [f"{'workload':<16} {'mode':<11} {'ops/sec':>9} {'p50 ms':>8} {'p95 ms':>8} "
+                 f"{'p99 ms':>8} {'conn/op':>8} {'CPU us/op':>10}"]
+        for r in results:
+            lines.append(f"{r['workload']:<16} {r['mode']:<11} {r['ops_per_sec']:>9.1f} "
+                         f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} "
+                         f"{r['connections_per_op']:>8.2f} {r['cpu_us_per_op']:>10.1f}")
+        text = '\n'.join(lines)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
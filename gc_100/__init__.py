@@ -1,6 +1,13 @@
-from gc_100.core import GC100, CommandError
+from gc_100.broker import SerialBroker
+from gc_100.core import (GC100, CommandError, CommandTimeout, ConnectionLost, ITachError,
+                         Unavailable, deadline)
+from gc_100.fleet import GC100Fleet
+from gc_100.irlib import IRLibrary
+from gc_100.macro import Macro
+from gc_100.messages import (CompleteIR, Device, ErrorMessage, IRMode, NetConfig,
+                              SerialConfig, State, StateChange, Version)
+from gc_100.poller import InputPoller
 from gc_100.read_ir import Digital_In
-from gc_100.relay import Relay
+from gc_100.relay import Relay, RelayBank
 from gc_100.send_ir import IR_out
 from gc_100.serial import Serial, SerialError
-
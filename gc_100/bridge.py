@@ -0,0 +1,292 @@
+"""Bridge GC-100 serial ports to local TCP ports or pseudo-terminals (PTYs).
+
+For tools that expect a local serial device, or a raw TCP port:
+
+    $ python -m gc_100.bridge --host 192.168.1.99 --tcp 1:1,0,5000 --pty 2:1,1,/tmp/ttyGC1
+
+Each bridge keeps its GC-100 serial port connected (reconnecting as necessary),
+and passes data through in both directions.  Neither direction reads more than
+the other end can take: data from the local client is paced by 'Serial.send()',
+and data from the GC-100 waits for the local client to drain it.  One local TCP
+client is served at a time (further connections are refused, as by the GC-100).
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from .core import DEFAULT_PORT, GC100
+from .serial import Serial, SerialError
+
+CHUNK_SIZE = 4096
+
+
+class Bridge:
+    """Pass data between 'serial' (a gc_100.Serial) and a local client.
+
+    Start it with 'serve_tcp()' or 'serve_pty()'.  While no local client is
+    connected, data from the GC-100 is discarded (and counted in 'dropped').
+    """
+
+    def __init__(self, serial, name=None, reconnect_delay=1.0):
+        self._serial = serial
+        self.name = name
+        self._reconnect_delay = reconnect_delay
+        self._up = asyncio.Event()
+        self._upstream = None
+        self._server = None
+        self._pty = None
+        self._client = None
+        self._tasks = set()
+        self.bytes_up = 0
+        self.bytes_down = 0
+        self.dropped = 0
+        self.reconnects = 0
+        self.clients = 0
+        self._mark = (time.monotonic(), 0, 0)
+
+    async def serve_tcp(self, host='127.0.0.1', port=0):
+        """Listen for a local client on 'host':'port'; return the (host, port) used."""
+        self._start()
+        self._server = await asyncio.start_server(self._serve_client, host, port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def serve_pty(self, link=None):
+        """Open a PTY, optionally linked (symlinked) from 'link'; return its device name."""
+        self._start()
+        self._pty = _PTY(link)
+        r, w = await self._pty.open()
+        self._spawn(self._serve_client(r, w))
+        return self._pty.name
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        tasks = list(self._tasks)
+        if self._upstream is not None:
+            tasks.append(self._upstream)
+            self._upstream = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._pty is not None:
+            self._pty.close()
+            self._pty = None
+        await self._serial.disconnect()
+
+    def stats(self):
+        """Return throughput (bytes per second, since the last call) and queue depths."""
+        now = time.monotonic()
+        then, up, down = self._mark
+        self._mark = (now, self.bytes_up, self.bytes_down)
+        elapsed = max(now - then, 1e-9)
+        return {
+            'name': self.name,
+            'connected': self._up.is_set(),
+            'client': self._client is not None,
+            'bytes_up': self.bytes_up,
+            'bytes_down': self.bytes_down,
+            'up_rate': (self.bytes_up - up) / elapsed,
+            'down_rate': (self.bytes_down - down) / elapsed,
+            'queued_up': self._serial.pending(),
+            'queued_down': 0 if self._client is None
+                           else self._client.transport.get_write_buffer_size(),
+            'dropped': self.dropped,
+            'reconnects': self.reconnects,
+            'clients': self.clients,
+        }
+
+    def _start(self):
+        if self._upstream is None:
+            self._upstream = asyncio.create_task(self._run_upstream())
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_upstream(self):
+        """Keep the GC-100 serial port connected, passing its data to the client."""
+        first = True
+        while True:
+            try:
+                await self._serial.connect()
+            except OSError:
+                await asyncio.sleep(self._reconnect_delay)
+                continue
+            if not first:
+                self.reconnects += 1
+            first = False
+            self._up.set()
+            try:
+                while True:
+                    data = await self._serial.recv(CHUNK_SIZE)
+                    if not data:
+                        break
+                    client = self._client
+                    if client is None:
+                        self.dropped += len(data)
+                        continue
+                    client.write(data)
+                    self.bytes_down += len(data)
+                    try:
+                        await client.drain()
+                    except OSError:
+                        # the client's gone; its handler cleans up.
+                        pass
+            except (SerialError, OSError):
+                pass
+            self._up.clear()
+            await self._serial.disconnect()
+            await asyncio.sleep(self._reconnect_delay)
+
+    async def _serve_client(self, r, w):
+        if self._client is not None:
+            # one client at a time.
+            w.close()
+            return
+        self._client = w
+        self.clients += 1
+        try:
+            while True:
+                data = await r.read(CHUNK_SIZE)
+                if not data:
+                    break
+                await self._send(data)
+        except OSError:
+            pass
+        finally:
+            self._client = None
+            w.close()
+
+    async def _send(self, data):
+        # if the connection fails, resend once it's back.
+        while True:
+            await self._up.wait()
+            try:
+                await self._serial.send(data)
+                self.bytes_up += len(data)
+                return
+            except (SerialError, OSError):
+                if not self._serial.is_connected():
+                    self._up.clear()
+
+
+class _PTY:
+    """The master side of a raw-mode pseudo-terminal, as an asyncio stream."""
+
+    def __init__(self, link=None):
+        self._link = link
+        self._master = None
+        self._slave = None
+        self._reader = None
+        self._writer = None
+        self.name = None
+
+    async def open(self):
+        import tty  # Unix only
+        self._master, self._slave = os.openpty()
+        # keep the slave open, so the master doesn't fail (EIO) between clients.
+        tty.setraw(self._slave)
+        self.name = os.ttyname(self._slave)
+        if self._link is not None:
+            if os.path.islink(self._link):
+                os.unlink(self._link)
+            os.symlink(self.name, self._link)
+
+        loop = asyncio.get_running_loop()
+        r = asyncio.StreamReader()
+        self._reader, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(r),
+                                     os.fdopen(self._master, 'rb', 0, closefd=False))
+        transport, protocol = await loop.connect_write_pipe(
+            lambda: asyncio.StreamReaderProtocol(asyncio.StreamReader()),
+            os.fdopen(os.dup(self._master), 'wb', 0))
+        self._writer = asyncio.StreamWriter(transport, protocol, r, loop)
+        return r, self._writer
+
+    def close(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._link is not None and os.path.islink(self._link):
+            os.unlink(self._link)
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self._master = self._slave = None
+
+
+def _bridge_spec(text):
+    """Parse 'ADDR,INDEX,WHERE' (e.g., '1:1,0,5000')."""
+    addr, index, where = text.split(',', 2)
+    return addr, int(index), where
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bridge GC-100 serial ports to local TCP ports or PTYs")
+    parser.add_argument('--host', required=True,
+                        help="address of the GC-100")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help=f"command port of the GC-100 (default = {DEFAULT_PORT})")
+    parser.add_argument('--tcp', action='append', default=[], type=_bridge_spec,
+                        metavar='ADDR,INDEX,[HOST:]PORT',
+                        help="serve serial port INDEX (at connector ADDR) on a local TCP port")
+    parser.add_argument('--pty', action='append', default=[], type=_bridge_spec,
+                        metavar='ADDR,INDEX,LINK',
+                        help="serve serial port INDEX (at connector ADDR) on a PTY, linked from LINK")
+    parser.add_argument('--baudrate', type=int, default=None,
+                        help="serial baud rate, for pacing (default: ask the GC-100)")
+    parser.add_argument('--stats', type=float, default=0,
+                        help="report throughput and queue depths every so many seconds")
+    args = parser.parse_args()
+    if not args.tcp and not args.pty:
+        parser.error("nothing to bridge (use --tcp and/or --pty)")
+
+    async def run():
+        gc = GC100(args.host, args.port)
+        bridges = []
+        try:
+            for addr, index, where in args.tcp:
+                host, _, port = where.rpartition(':')
+                bridge = Bridge(Serial(gc, addr, index, baudrate=args.baudrate), name=addr)
+                bridges.append(bridge)
+                local = await bridge.serve_tcp(host or '127.0.0.1', int(port))
+                print(f"{addr} (serial {index}) on {local[0]}:{local[1]}")
+            for addr, index, link in args.pty:
+                bridge = Bridge(Serial(gc, addr, index, baudrate=args.baudrate), name=addr)
+                bridges.append(bridge)
+                device = await bridge.serve_pty(link)
+                print(f"{addr} (serial {index}) on {link} -> {device}")
+
+            while True:
+                if args.stats <= 0:
+                    await asyncio.Event().wait()
+                await asyncio.sleep(args.stats)
+                for bridge in bridges:
+                    s = bridge.stats()
+                    print(f"{s['name']}: up {s['up_rate']:.0f} B/s, down {s['down_rate']:.0f} B/s, "
+                          f"queued up {s['queued_up']} down {s['queued_down']}, "
+                          f"dropped {s['dropped']}, reconnects {s['reconnects']}"
+                          f"{'' if s['connected'] else ' (disconnected)'}", flush=True)
+        finally:
+            for bridge in bridges:
+                await bridge.close()
+            await gc.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Sharing one GC-100 serial port among many local consumers"""
+
+import asyncio
+
+# What a subscription does when it's full:
+DROP_OLDEST = 'drop_oldest'  # discard the oldest queued data
+DROP_NEWEST = 'drop_newest'  # discard the new data
+BLOCK = 'block'              # stop reading from the serial port until there's room
+
+CHUNK_SIZE = 4096
+
+
+class SerialSubscription:
+    """Asynchronous iterator of data received on a (brokered) serial port.
+
+    Items are bytes: chunks as received, or frames (if the broker has a framer).
+    Up to 'maxsize' items are queued until they're read; when full, 'policy'
+    applies (see DROP_OLDEST, DROP_NEWEST, BLOCK).  Iteration ends when the
+    subscription, or the broker, is closed.
+    """
+
+    def __init__(self, broker, maxsize=100, policy=DROP_OLDEST):
+        if policy not in (DROP_OLDEST, DROP_NEWEST, BLOCK):
+            raise ValueError(f"unknown policy '{policy}'")
+        self._broker = broker
+        self._policy = policy
+        self._queue = asyncio.Queue(maxsize)
+        self._closed = False
+        self.dropped = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._closed and self._queue.empty():
+            raise StopAsyncIteration
+        item = await self._queue.get()
+        if item is None:
+            raise StopAsyncIteration
+        return item
+
+    async def send(self, msg):
+        """Send 'msg' (in bytes) to the serial port, through the broker."""
+        await self._broker.send(msg)
+
+    def close(self):
+        """Stop receiving data; any iteration in progress ends."""
+        if self._closed:
+            return
+        self._closed = True
+        self._broker._remove(self)
+        if self._queue.full():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+    async def _put(self, item):
+        if self._queue.full():
+            if self._policy == BLOCK:
+                await self._queue.put(item)
+                return
+            self.dropped += 1
+            if self._policy == DROP_NEWEST:
+                return
+            self._queue.get_nowait()
+        self._queue.put_nowait(item)
+
+
+class SerialBroker:
+    """Share one serial port (one 'Serial' connection) with any number of subscribers.
+
+    Everything received is passed to every subscriber: as received, or split
+    into frames by 'framer' (see gc_100.framing).  Data sent by subscribers
+    is written one message at a time, in order, through the same connection.
+    So, adding a consumer doesn't add any load on the GC-100.
+
+    If reading fails, the exception is kept (as 'error') and all subscriptions end.
+    A BLOCK subscriber that falls behind holds up reading from the serial port
+    (and so, all of the other subscribers).
+    """
+
+    def __init__(self, serial, framer=None, max_size=65536):
+        self._serial = serial
+        self._framer = framer
+        self._max_size = max_size
+        self._subscriptions = []
+        self._send_lock = asyncio.Lock()
+        self._reader = None
+        self.received = 0
+        self.sent = 0
+        self.error = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def start(self):
+        """Connect the serial port (if necessary), and start passing on its data."""
+        await self._serial.connect()
+        if self._reader is None:
+            self._reader = asyncio.create_task(self._read())
+
+    async def close(self):
+        """Stop reading, end all subscriptions, and disconnect the serial port."""
+        reader = self._reader
+        self._reader = None
+        if reader is not None:
+            reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
+        self._close_subscriptions()
+        await self._serial.disconnect()
+
+    def subscribe(self, maxsize=100, policy=DROP_OLDEST):
+        subscription = SerialSubscription(self, maxsize, policy)
+        self._subscriptions.append(subscription)
+        return subscription
+
+    def subscribers(self):
+        return len(self._subscriptions)
+
+    async def send(self, msg):
+        """Send 'msg' (in bytes) to the serial port."""
+        async with self._send_lock:
+            await self._serial.send(msg)
+            self.sent += len(msg)
+
+    async def _items(self):
+        if self._framer is not None:
+            async for frame in self._serial.frames(self._framer, self._max_size):
+                yield frame
+        else:
+            while True:
+                data = await self._serial.recv(CHUNK_SIZE)
+                if not data:
+                    return
+                yield data
+
+    async def _read(self):
+        try:
+            async for item in self._items():
+                self.received += len(item)
+                for subscription in list(self._subscriptions):
+                    await subscription._put(item)
+        except Exception as e:
+            self.error = e
+        finally:
+            # the connection closed (or failed); nothing more is coming.
+            self._close_subscriptions()
+
+    def _close_subscriptions(self):
+        for subscription in list(self._subscriptions):
+            subscription.close()
+
+    def _remove(self, subscription):
+        self._subscriptions.remove(subscription)
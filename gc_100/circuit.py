@@ -0,0 +1,65 @@
+"""Circuit breaker: fail fast while a GC-100 is known to be down"""
+
+import time
+
+CLOSED = 'closed'        # normal operation
+OPEN = 'open'            # failing fast
+HALF_OPEN = 'half_open'  # letting a trial request through
+
+
+class CircuitBreaker:
+    """Track a unit's failures; stop trying it after 'threshold' failures in a row.
+
+    While open, 'allow()' is False, for 'reset_timeout' seconds.  Then, one
+    trial request is allowed (half open): if it succeeds the breaker closes;
+    if it fails, it opens again.  (If the trial never finishes, another is
+    allowed after 'reset_timeout'.)
+    """
+
+    def __init__(self, threshold=5, reset_timeout=30.0):
+        self._threshold = threshold
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened = None
+        self._trial = None  # when the trial request started
+        self.trips = 0
+
+    @property
+    def state(self):
+        if self._opened is None:
+            return CLOSED
+        if self._trial is not None or time.monotonic() - self._opened >= self._reset_timeout:
+            return HALF_OPEN
+        return OPEN
+
+    def allow(self):
+        """May a request be tried now?"""
+        if self._opened is None:
+            return True
+        now = time.monotonic()
+        if self._trial is not None and now - self._trial < self._reset_timeout:
+            # only one trial at a time
+            return False
+        if now - self._opened >= self._reset_timeout:
+            self._trial = now
+            return True
+        return False
+
+    def retry_after(self):
+        """Return the seconds until a trial request will be allowed (0 if now)."""
+        if self._opened is None:
+            return 0.0
+        return max(0.0, self._opened + self._reset_timeout - time.monotonic())
+
+    def success(self):
+        self._failures = 0
+        self._opened = None
+        self._trial = None
+
+    def failure(self):
+        self._failures += 1
+        if self._trial is not None or (self._opened is None and self._failures >= self._threshold):
+            if self._opened is None:
+                self.trips += 1
+            self._opened = time.monotonic()
+        self._trial = None
@@ -4,6 +4,22 @@
 """
 
 import asyncio
+import contextlib
+import contextvars
+import functools
+import random
+import time
+import weakref
+
+from . import ircode
+from . import messages
+from . import notify
+from . import pool
+from . import protocol
+from . import scheduler
+from .instrument import CommandTiming
+from .topology import Topology
+from .session import Session
 
 # It's not clear that you CAN change the command port on the GC-100.
 # But if you ever can, we'll need to make it configurable; keep the
@@ -16,6 +32,39 @@ CR = b'\r'
 # Command (and response) fields are separated by commas.
 SEP = ','
 
+# Scheduling priority, by command name.  Anything else is scheduler.NORMAL.
+PRIORITY = {
+    'stopir': scheduler.URGENT,
+    'setstate': scheduler.HIGH,
+}
+
+# Queries, which may safely be retried.  Anything else (e.g., 'sendir', 'setstate')
+# actually does something, and is never retried.
+IDEMPOTENT = {'getdevices', 'getstate', 'get_IR', 'get_NET', 'get_SERIAL', 'getversion'}
+
+# The most to wait between retries, in seconds.
+MAX_RETRY_BACKOFF = 2.0
+
+# The deadline (time.monotonic()) for commands in the current context; see 'deadline()'.
+_deadline = contextvars.ContextVar('gc_100_deadline', default=None)
+
+
+@contextlib.contextmanager
+def deadline(seconds):
+    """Limit GC-100 commands within this block to finish in 'seconds' (all told).
+
+    This applies to every command run in the block, including those run in
+    tasks started within it (e.g., by asyncio.gather()).  An inner deadline
+    can't extend an outer one.  Commands not finished in time raise CommandTimeout.
+    """
+    when = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(when if outer is None else min(outer, when))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
 
 class Error(Exception):
     pass
@@ -46,9 +95,65 @@ class CommandError(Error):
         self.errno = errno
 
     def __str__(self):
-        text = CommandError.ERR_TEXT.get(self.errno)
+        text = self.ERR_TEXT.get(self.errno)
         return f"({self.errno}) {text}"
 
+class ITachError(CommandError):
+    """An iTach error response ('ERR_<addr>,<nnn>'); 'addr' is None if not given."""
+
+    ERR_TEXT = {
+        1: "Invalid command. Command not found.",
+        2: "Invalid module address (does not exist).",
+        3: "Invalid connector address (does not exist).",
+        4: "Invalid ID value.",
+        5: "Invalid frequency value.",
+        6: "Invalid repeat value.",
+        7: "Invalid offset value.",
+        8: "Invalid pulse count.",
+        9: "Invalid pulse data.",
+        10: "Uneven amount of <on|off> statements.",
+        11: "No carriage return found.",
+        12: "Repeat count exceeded.",
+        13: "IR command sent to input connector.",
+        14: "Blaster command sent to non-blaster connector.",
+        15: "No carriage return before buffer full.",
+        16: "No carriage return.",
+        17: "Bad command syntax.",
+        18: "Sensor command sent to non-input connector.",
+        19: "Repeated IR transmission failure.",
+        20: "Above designated IR <on|off> pair limit.",
+        21: "Symbol odd boundary.",
+        22: "Undefined symbol.",
+        23: "Unknown option.",
+        24: "Invalid baud rate setting.",
+        25: "Invalid flow control setting.",
+        26: "Invalid parity setting.",
+        27: "Settings are locked."
+    }
+
+    def __init__(self, errno, addr=None):
+        super().__init__(errno)
+        self.addr = addr
+
+class CommandTimeout(Error, TimeoutError):
+    """A command didn't finish in time (see 'GC100(timeout=...)' and 'deadline()')."""
+
+    def __init__(self, command, addr=None):
+        self.command = command
+        self.addr = addr
+        super().__init__(f"'{command}'{f' to {addr}' if addr else ''} timed out")
+
+class ConnectionLost(Error, ConnectionError):
+    """The command port connection closed (or broke) before the command finished."""
+
+class Unavailable(Error, ConnectionError):
+    """The GC-100 is known to be down (its circuit breaker is open); try again later."""
+
+    def __init__(self, host, retry_after):
+        self.host = host
+        self.retry_after = retry_after
+        super().__init__(f"GC-100 at {host} is unavailable (retry in {retry_after:.1f}s)")
+
 
 class GC100:
     """Global Cache GC-100 device
@@ -65,17 +170,24 @@ class GC100:
     Each helper class also includes relevant queries and configurations.
 
     This module/package has *limited* applicability to iTach devices.
-    The error responses for GC-100 and iTach are different; iTach errors will 
-    NOT be detected here (so don't make any mistakes :-).  Not all iTach features
-    (e.g., <some IR mode(s)>) are supported here.
+    The error responses for GC-100 and iTach are different; iTach errors are
+    raised as ITachError (a CommandError, with the iTach's error numbers).  Not
+    all iTach features (e.g., <some IR mode(s)>) are supported here.
     """
     
-    # At this point, command port connections are ephemeral:
+    # By default, command port connections are ephemeral:
     # connect to the port; do something; close the port.
     # This works as long as there is no unsolicitied traffic from the GC-100;
     # which is true UNLESS one of the IR connections is configured for SENSOR_NOTIFY,
     # in which case the connection must stay open (and monitored) in order to receive
-    # the state change notifications.
+    # the state change notifications.  Subscribing to state changes (see 'subscribe()')
+    # does just that: it keeps a connection open and monitored, using the persistent
+    # session if there is one, or a dedicated connection if not.
+    #
+    # Alternatively (persistent=True), a single command port connection is kept open
+    # and reused for every command.  This avoids the connect/close (and post-close
+    # sleep) on every command.  If the connection breaks, it is re-established
+    # (with backoff) on the next command.
 
     # This implementation assumes success.
     # Any exceptions (e.g., broken connections) are simply raised.
@@ -86,33 +198,443 @@ class GC100:
     # and we usually don't want to do that.  Additionally, being able to interleave other commands
     # may also interleave any responses, which will make sorting them out difficult.
     #
-    # So: we create a "lock" that ensures each request runs to completion before
-    # letting the next one start.  This is a problem for things like 'stopir', but otherwise
-    # acceptable.
+    # So: every command is run through a scheduler (see gc_100.scheduler), which queues
+    # commands by connector address.  Each request runs to completion before the next
+    # one on the same connector starts.  'stopir' jumps the queue (it has to, to be of
+    # any use), and relay commands go ahead of IR.
+    #
+    # With ephemeral connections, only one command runs at a time (each one is a new
+    # connection, and the GC-100 doesn't have many to spare).  The persistent session pipelines
+    # requests, matching each response to its request (see gc_100.session), so commands on
+    # different connectors run concurrently, e.g. while IR is being sent.
+    #
+    # With 'connections' > 1 (or None, for the 'model's usual number; see gc_100.pool),
+    # that many commands run at once, each on its own ephemeral connection; or, if
+    # persistent, requests are spread over a pool of that many persistent connections.
+    #
+    # Configuration (module list, IR modes, serial settings, versions) can be cached
+    # (cache_ttl, in seconds; float('inf') for "forever").  Setting an IR mode or serial
+    # parameters invalidates the affected entry.  While the cache knows a connector's
+    # configuration, commands that are sure to fail (e.g., 'sendir' to a SENSOR port)
+    # are rejected locally, with the same CommandError the GC-100 would have returned.
+    #
+    # Deadlines: each command may be limited to 'timeout' seconds (per client), to
+    # 'timeout' seconds (per call: see 'raw_request()'), and/or by a 'deadline()' (for
+    # everything in a block).  The earliest applies; a command that runs out of time
+    # raises CommandTimeout.  A connection that breaks raises ConnectionLost.
+    # Queries (see IDEMPOTENT) that time out or lose their connection are retried (up to
+    # 'retries' times, within the deadline), after a random ("jittered"), exponentially
+    # increasing delay.  Commands that do something are never retried.
+    #
+    # With a 'breaker' (see gc_100.circuit), repeated timeouts and connection failures
+    # mark the GC-100 as down; then commands fail immediately (with Unavailable) until
+    # it's time to try again.
+    #
+    # Identical queries (see IDEMPOTENT) which are in progress at the same time are
+    # coalesced (unless 'coalesce' is False): only the first is sent, and everyone gets
+    # its response.  With a 'coalesce_window' (seconds), a response is also reused
+    # for identical queries within that time after it arrives.  Any command that
+    # changes something (e.g., 'setstate') discards those responses.
+    #
+    # Instrumentation: given an 'instrument' (see gc_100.instrument), every command is
+    # timed (queued, connected, written, first byte, complete) and reported, along
+    # with connections, reconnections, CommandErrors, and serial data.  Without one
+    # (the default), none of that is done.
     
-    def __init__(self, host, port=DEFAULT_PORT):
+    def __init__(self, host, port=DEFAULT_PORT, persistent=False, cache_ttl=None,
+                 instrument=None, timeout=None, retries=2, retry_backoff=0.1, breaker=None,
+                 coalesce=True, coalesce_window=0.0, connections=1, model='GC-100'):
         self._host = host
         self._port = port
-        self._cmd_lock = asyncio.Lock()
-        self._partial = b''
+        self._instrument = instrument
+        self._timeout = timeout
+        self._retries = retries
+        self._retry_backoff = retry_backoff
+        self._breaker = breaker
+        self._coalesce = coalesce
+        self._coalesce_window = coalesce_window
+        # queries in progress, and recent responses (expiry, response); by command
+        self._inflight = {}
+        self._recent = {}
+        # how many callers are waiting for each shared query
+        self._waiting = {}
+        # response parsers for (legacy) StreamReader connections; see 'recv_response()'
+        self._parsers = weakref.WeakKeyDictionary()
+        if connections is None:
+            connections = pool.CONNECTIONS.get(model, 1)
+        if persistent:
+            if connections > 1:
+                self._session = pool.SessionPool(self._new_session, connections)
+            else:
+                self._session = self._new_session()
+            self._scheduler = scheduler.Scheduler(concurrency=8 * connections)
+        else:
+            self._session = None
+            self._scheduler = scheduler.Scheduler(concurrency=connections)
+        self._ir_id = 0
+        self._topology = Topology(cache_ttl) if cache_ttl is not None else None
+        self._notifier = notify.Notifier()
+        self._reconnect_listeners = []
+        self._monitor = None
+        self._monitor_session = None
+        if self._session is not None:
+            self._session.on_unsolicited = self._unsolicited
         # @todo etc.
 
+    def _new_session(self):
+        session = Session(self._host, self._port, timed=self._instrument is not None)
+        session.on_connect = self._connected
+        return session
+
+    def _connected(self, seconds, reconnected=False):
+        if self._instrument is not None:
+            self._instrument.connected(self._host, seconds)
+            if reconnected:
+                self._instrument.reconnected(self._host)
+        if reconnected:
+            loop = asyncio.get_running_loop()
+            for callback in self._reconnect_listeners:
+                loop.call_soon(callback)
+
+    async def _connect(self, timing=None):
+        """Open an ephemeral command port connection (with its own response parser)."""
+        if timing is None:
+            return await protocol.open_connection(self._host, self._port)
+        t_start = time.monotonic()
+        conn = await protocol.open_connection(self._host, self._port, timed=True)
+        timing.connected = time.monotonic()
+        self._connected(timing.connected - t_start)
+        return conn
+
+    async def _disconnect(self, conn):
+        """Close an ephemeral command port connection."""
+        conn.close()
+        await conn.wait_closed()
+        # wait_closed() does not seem to actually wait until the socket is
+        # completely closed.  Consequently, attempting to open a new connection
+        # on the same port too quickly will fail.  Hence the kludgy "sleep" hack:
+        await asyncio.sleep(0.01)
+
+    def _route(self, data):
+        """Return the (command name, connector address, priority) for scheduling 'data'.
+
+        The address is None for commands that don't name a connector.
+        """
+        tokens = data.rstrip(CR).split(b',', 2)
+        name = tokens[0].decode('ascii')
+        addr = None
+        if len(tokens) > 1 and b':' in tokens[1]:
+            addr = tokens[1].decode('ascii')
+        return name, addr, PRIORITY.get(name, scheduler.NORMAL)
+
+    def _check_cached(self, name, addr):
+        """Raise CommandError if the cached configuration says command 'name' will fail."""
+        if addr is None:
+            return
+        module, port = addr.split(':')
+        module_type = self._topology.module_type(module)
+        if name == 'sendir' and module_type not in (None, 'IR'):
+            raise CommandError(21)
+        if name == 'setstate' and module_type not in (None, 'RELAY'):
+            raise CommandError(11)
+        if name in ('sendir', 'getstate') and module_type in (None, 'IR'):
+            ir = self._topology.get(('IR', addr))
+            if ir is None:
+                return
+            sensor = self.parse_IR(ir).get('mode', '').startswith('SENSOR')
+            if name == 'sendir' and sensor:
+                # errors 5-7: IR on a sensor, connector 1-3
+                raise CommandError(4 + int(port))
+            if name == 'getstate' and not sensor:
+                raise CommandError(13)
+
+    async def _cached_request(self, key, data):
+        """As 'raw_request()', but use (and fill) the configuration cache, if any."""
+        if self._topology is None:
+            return await self.raw_request(data)
+        response = self._topology.get(key)
+        if response is None:
+            response = await self.raw_request(data)
+            self._topology.put(key, response)
+        return response
+
+    def _timing(self):
+        """Return a new CommandTiming, if instrumented; otherwise None."""
+        return None if self._instrument is None else CommandTiming()
+
+    def _report(self, name, addr, timing, error=None):
+        """Report a command's 'timing' (and CommandError, if any) to the instrument."""
+        timing.completed = time.monotonic()
+        if isinstance(error, CommandError):
+            self._instrument.command_error(self._host, name, addr, error.errno)
+        self._instrument.command(self._host, name, addr, timing)
+
+    async def _recv(self, conn, timing):
+        """Return the next response (gc_100.protocol.Response) from ephemeral connection 'conn'."""
+        response = await conn.recv()
+        if not response.text and not conn.is_open():
+            raise ConnectionLost("GC-100 closed the command connection")
+        if timing is not None:
+            if timing.first_byte is None:
+                timing.first_byte = response.received
+            timing.responded = time.monotonic()
+        return response
+
+    def _deadline(self, timeout=None):
+        """Return the deadline (time.monotonic()) for a command, or None if there isn't one."""
+        when = _deadline.get()
+        for seconds in (timeout, self._timeout):
+            if seconds is not None:
+                mine = time.monotonic() + seconds
+                when = mine if when is None else min(when, mine)
+        return when
+
+    async def _call(self, name, addr, attempt, timeout=None):
+        """Run (and await) 'attempt()', subject to deadlines, retries and the circuit breaker."""
+        when = self._deadline(timeout)
+        retries = self._retries if name in IDEMPOTENT else 0
+        delay = self._retry_backoff
+        while True:
+            if self._breaker is not None and not self._breaker.allow():
+                raise Unavailable(self._host, self._breaker.retry_after())
+            try:
+                if when is None:
+                    result = await attempt()
+                else:
+                    remaining = when - time.monotonic()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError()
+                    result = await asyncio.wait_for(attempt(), remaining)
+            except CommandError:
+                # the GC-100 is alive and well (it answered)
+                if self._breaker is not None:
+                    self._breaker.success()
+                raise
+            except (asyncio.TimeoutError, TimeoutError) as e:
+                error, cause = CommandTimeout(name, addr), e
+            except (Error, ConnectionRefusedError) as e:
+                # ConnectionLost (or never connected)
+                error, cause = e, None
+            except ConnectionError as e:
+                error, cause = ConnectionLost(str(e)), e
+            except OSError as e:
+                error, cause = e, None
+            else:
+                if self._breaker is not None:
+                    self._breaker.success()
+                return result
+
+            if self._breaker is not None:
+                self._breaker.failure()
+            pause = random.uniform(0, delay)
+            if retries <= 0 or (when is not None and time.monotonic() + pause >= when):
+                if cause is None:
+                    raise error
+                raise error from cause
+            retries -= 1
+            await asyncio.sleep(pause)
+            delay = min(delay * 2, MAX_RETRY_BACKOFF)
+
+    async def _shared(self, key, name, addr, request, timeout=None):
+        """Run query 'request()' once, for every concurrent caller with the same 'key'.
+
+        The shared query is bound only by the client's own timeout, not by any
+        caller's; each caller waits for it only until its own deadline.  Once
+        every caller has given up, it's cancelled.
+        """
+        if self._recent:
+            recent = self._recent.get(key)
+            if recent is not None:
+                if time.monotonic() < recent[0]:
+                    return recent[1]
+                del self._recent[key]
+        when = self._deadline(timeout)
+        while True:
+            task = self._inflight.get(key)
+            if task is None or task.done():
+                task = asyncio.ensure_future(self._query(name, addr, request))
+                self._inflight[key] = task
+                task.add_done_callback(functools.partial(self._landed, key))
+            # One caller giving up mustn't cancel it for the others.
+            self._waiting[task] = self._waiting.get(task, 0) + 1
+            timed_out = False
+            try:
+                if when is None:
+                    return await asyncio.shield(task)
+                return await asyncio.wait_for(asyncio.shield(task),
+                                              max(0, when - time.monotonic()))
+            except CommandTimeout:
+                # It ran out of the client's time, not necessarily this caller's.
+                if when is None or time.monotonic() >= when:
+                    raise
+            except asyncio.TimeoutError as e:
+                timed_out = True
+                raise CommandTimeout(name, addr) from e
+            finally:
+                self._waiting[task] -= 1
+                if not self._waiting[task]:
+                    del self._waiting[task]
+                    self._abandon(key, task, timed_out)
+
+    def _abandon(self, key, task, timed_out):
+        """Cancel shared query 'task', now that nobody is waiting for it."""
+        if task.done():
+            return
+        task.cancel()
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if timed_out and self._breaker is not None:
+            # (as '_call()' would have counted it)
+            self._breaker.failure()
+
+    async def _query(self, name, addr, request):
+        # (The task's context is a copy of its first caller's.)
+        _deadline.set(None)
+        return await self._call(name, addr, request)
+
+    def _landed(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        if self._coalesce_window > 0:
+            self._recent[key] = (time.monotonic() + self._coalesce_window, task.result())
+
+    def instrument(self):
+        """Return the instrument (see gc_100.instrument), or None."""
+        return self._instrument
+
+    def invalidate(self, addr=None):
+        """Forget cached configuration for connector 'addr' (or everything, if None)."""
+        if self._topology is None:
+            return
+        if addr is None:
+            self._topology.invalidate()
+        else:
+            self._topology.invalidate(('IR', addr))
+            self._topology.invalidate(('SERIAL', addr))
+
+    async def close(self):
+        """Close the persistent command connection (if any), and stop monitoring.
+
+        Any subscriptions (see 'subscribe()') end.
+        """
+        self._notifier.close()
+        if self._monitor is not None:
+            self._monitor.cancel()
+            try:
+                await self._monitor
+            except asyncio.CancelledError:
+                pass
+            self._monitor = None
+        if self._monitor_session is not None:
+            await self._monitor_session.close()
+            self._monitor_session = None
+        if self._session is not None:
+            await self._session.close()
+
+    def _unsolicited(self, response):
+        message = messages.from_response(response)
+        if isinstance(message, messages.StateChange):
+            self._notifier.publish(message.as_dict())
+
+    def _start_monitor(self):
+        if self._monitor is not None:
+            return
+        if self._session is None:
+            self._monitor_session = self._new_session()
+            self._monitor_session.on_unsolicited = self._unsolicited
+        self._monitor = asyncio.create_task(self._monitoring())
+
+    async def _monitoring(self):
+        """Keep the monitored connection open, resynchronizing after each (re)connect."""
+        session = self._session or self._monitor_session
+        while True:
+            try:
+                await session.open()
+            except OSError:
+                # 'open()' has already backed off; the GC-100 is probably down.
+                await asyncio.sleep(5.0)
+                continue
+            await self._resync()
+            await session.wait_closed()
+
+    async def _resync(self):
+        """Read the current state of every connector of interest.
+
+        Changes we missed (while disconnected) are reported to subscribers.
+        """
+        addrs = list(self._notifier.addresses())
+        responses = await asyncio.gather(*(self.getstate(addr, typed=True) for addr in addrs),
+                                         return_exceptions=True)
+        for response in responses:
+            if isinstance(response, messages.State):
+                self._notifier.publish(response.as_dict())
+
+    def subscribe(self, addr=None, maxsize=100):
+        """Subscribe to state changes (e.g., from inputs configured for SENSOR_NOTIFY).
+
+        Returns an asynchronous iterator of changes, as from 'parse_statechange()',
+        for connector 'addr' (or all connectors, if None).  Close it when done.
+        Subscribing starts monitoring the GC-100 for unsolicited 'statechange'
+        messages; after every (re)connection, subscribed connectors are polled
+        (with 'getstate'), and any changes reported.
+        """
+        self._start_monitor()
+        return self._notifier.subscribe(addr, maxsize)
+
+    def add_listener(self, callback, addr=None):
+        """Call 'callback(change)' for each state change on 'addr' (or all, if None).
+
+        See 'subscribe()'.
+        """
+        self._start_monitor()
+        self._notifier.add_listener(callback, addr)
+
+    def remove_listener(self, callback, addr=None):
+        """Remove a callback added with 'add_listener()'."""
+        self._notifier.remove_listener(callback, addr)
+
+    def add_reconnect_listener(self, callback):
+        """Call 'callback()' whenever a persistent (or monitoring) connection is re-established.
+
+        The GC-100 may have restarted in the meantime; e.g., see gc_100.relay.RelayBank.
+        """
+        self._reconnect_listeners.append(callback)
+
+    def remove_reconnect_listener(self, callback):
+        self._reconnect_listeners.remove(callback)
+
+    def next_id(self):
+        """Return the next 'sendir' request ID (1-65535, wrapping around)."""
+        self._ir_id = self._ir_id % 65535 + 1
+        return self._ir_id
+
     def error_check(self, response):
         """Does 'response' denote an error?
 
-        If so, raise CommandError with the associated error number.
-        Use str() to see error text.
+        If so, raise CommandError with the associated error number (ITachError,
+        for an iTach error).  Use str() to see error text.
         """
         # The error response separator is a space, not a comma.
-        tokens = response.split(' ')
-        if tokens[0] == 'unknowncommand':
-            raise CommandError(int(tokens[1]))
+        if response.startswith('unknowncommand'):
+            raise CommandError(int(response.split(' ')[1]))
+        # iTach: 'ERR_<addr>,<nnn>' (or, on older firmware, 'ERR <nnn>')
+        if response.startswith('ERR'):
+            addr, _, errno = response[4:].rpartition(',')
+            raise ITachError(int(errno), addr or None)
 
     def format_sendir(self, addr, freq, code, id=1, count=1, offset=3):
         """Construct a raw 'sendir' command.
 
+        The 'code' is either a timing string (e.g., "342,171,21,21", possibly
+        compressed), or a sequence of timings, which is checked first (see
+        gc_100.ircode.check()).
         Returns 'bytes', correctly formatted for 'raw_request()', with trailing CR.
         """
+        if not isinstance(code, str):
+            ircode.check(code, offset)
+            code = ircode.timing_string(code)
         command = f"sendir,{addr},{id},{freq},{count},{offset},{code}"
         return bytes(command, encoding='utf8')+CR
 
@@ -120,6 +642,13 @@ class GC100:
         """Return the configured host IP [address]"""
         return self._host
     
+    def parse(self, response):
+        """Parse any response string into a typed message (see gc_100.messages).
+
+        E.g., "state,4:1,1" becomes State(addr='4:1', state=1).
+        """
+        return messages.parse(response)
+
     def parse_device(self, device):
         """Parse a single device string response (as from 'getdevices').
 
@@ -192,6 +721,19 @@ class GC100:
         return {'addr': tokens[1],
                 'state': int(tokens[2])}
     
+    def parse_statechange(self, change):
+        """Parse an unsolicited digital input state change (from SENSOR_NOTIFY).
+
+        The given 'change' should be the complete string, including the leading "statechange" 
+        token, but excluding the trailing CR.  This will return a dict with the component
+        values for the connector address and state (as integer 0 or 1).
+        """
+        tokens = change.split(SEP)
+        if tokens[0] != 'statechange':
+            return {}
+        return {'addr': tokens[1],
+                'state': int(tokens[2])}
+    
     def parse_version(self, version):
         """Parse a module version string (as from 'getversion').
 
@@ -212,77 +754,124 @@ class GC100:
         strings.  It will also combine partial responses (as from a heavily loaded 
         network or NIC) to construct the complete string.  Responses are returned as
         ASCII strings *without* the trailing CR.
+
+        The 'reader' is a command port connection (from gc_100.protocol), or an
+        asyncio.StreamReader.  Either way, each connection has its own parser.
+        If the connection closes, any partial response is returned; after that,
+        this raises ConnectionLost.
         """
-        idx = self._partial.find(CR)
-        if idx != -1:
-            # there's a complete response available
-            response = self._partial[0:idx]
-            self._partial = self._partial[idx+1:]
-            return response.decode('ascii')
-        else:
+        if isinstance(reader, protocol.CommandProtocol):
+            response = await reader.recv()
+            if not response.text and not reader.is_open():
+                raise ConnectionLost("GC-100 closed the command connection")
+            return response.text
+
+        parser = self._parsers.get(reader)
+        if parser is None:
+            parser = self._parsers[reader] = protocol.ResponseParser()
+        while True:
+            response = parser.next_response()
+            if response is not None:
+                return response.text
             # we don't have a complete response; go get more
             data = await reader.read(1024)
             if not data:
-                # socket closed on us; return whatever we have.
-                # Note that this may be a mistake.  If the caller/client doesn't
-                # realize that the connection is broken, we'll just spin around here
-                # constantly returning nothing.  Keep an eye on it.
-                response = self._partial
-                self._partial = b''
-                return response.decode('ascii')
-            else:
-                # append data read and see if there's a complete response in there.
-                self._partial += data
-                return await self.recv_response(reader)
+                # socket closed on us; return whatever we have (if anything).
+                remainder = parser.remainder()
+                if not remainder:
+                    raise ConnectionLost("GC-100 closed the command connection")
+                return remainder
+            parser.feed(data)
 
             
-    async def raw_command(self, data):
+    async def raw_command(self, data, timeout=None):
         """Send a command (not expecting a response).
 
         The 'data' should be well-formed: as 'bytes' terminated with a CR.
-        This will send it and return.
+        This will send it and return.  If it takes more than 'timeout' seconds
+        (if given), this raises CommandTimeout.
         """
-        async with self._cmd_lock:
-            r, w = await asyncio.open_connection(self._host, self._port)
-            try:
-                self._partial = b''
-                w.write(data)
-                await w.drain()
-                # this is a *command*.  No response expected.
-            finally:
-                w.close()
-                await w.wait_closed()
-                # wait_closed() does not seem to actually wait until the socket is
-                # completely closed.  Consequenctly, attempting to open a new connection
-                # on the same port too quickly will fail.  Hence the kludgy "sleep" hack:
-                await asyncio.sleep(0.01)
+        name, addr, priority = self._route(data)
+        if self._recent:
+            self._recent.clear()
+        await self._call(name, addr, lambda: self._command(data, name, addr, priority), timeout)
+
+    async def _command(self, data, name, addr, priority):
+        timing = self._timing()
+        try:
+            async with self._scheduler.slot(addr, priority):
+                if timing is not None:
+                    timing.scheduled = time.monotonic()
+                if self._session is not None:
+                    await self._session.send(data, timing)
+                    return
+
+                conn = await self._connect(timing)
+                try:
+                    conn.write(data)
+                    if timing is not None:
+                        timing.written = time.monotonic()
+                    await conn.drain()
+                    # this is a *command*.  No response expected.
+                finally:
+                    await self._disconnect(conn)
+        finally:
+            if timing is not None:
+                self._report(name, addr, timing)
 
         
-    async def raw_request(self, data):
+    async def raw_request(self, data, timeout=None, typed=False):
         """Send a command, expecting a response.
 
         The 'data' should be well-formed: as 'bytes' terminated with a CR.
         This will send it and wait for a response.  If the response is an 
         error it will raise CommandError; otherwise it will return the response
-        *as an ASCII string* without the trailing CR.
+        *as an ASCII string* without the trailing CR (or, if 'typed', as a
+        message; see 'parse()').  If it takes more than 'timeout' seconds
+        (if given), this raises CommandTimeout.
         """
-        async with self._cmd_lock:
-            r, w = await asyncio.open_connection(self._host, self._port)
-            self._partial = b''
-            try:
-                w.write(data)
-                await w.drain()
-                # this is a *request*.  There should be a response.
-                response = await self.recv_response(r)
-                self.error_check(response)
-            finally:
-                w.close()
-                await w.wait_closed()
-                # wait_closed() does not seem to actually wait until the socket is
-                # completely closed.  Consequently, attempting to open a new connection
-                # on the same port too quickly will fail.  Hence the kludgy "sleep" hack:
-                await asyncio.sleep(0.01)
-            return response
+        name, addr, priority = self._route(data)
+        if self._topology is not None:
+            self._check_cached(name, addr)
+        request = lambda: self._request(data, name, addr, priority, typed)
+        if name in IDEMPOTENT:
+            if self._coalesce:
+                key = (data, 'typed') if typed else data
+                return await self._shared(key, name, addr, request, timeout)
+        elif self._recent:
+            self._recent.clear()
+        return await self._call(name, addr, request, timeout)
+
+    async def _request(self, data, name, addr, priority, typed=False):
+        timing = self._timing()
+        error = None
+        try:
+            async with self._scheduler.slot(addr, priority):
+                if timing is not None:
+                    timing.scheduled = time.monotonic()
+                if self._session is not None:
+                    response = await self._session.request(data, timing=timing, typed=typed)
+                    self.error_check(str(response))
+                    return response
+
+                conn = await self._connect(timing)
+                try:
+                    conn.write(data)
+                    if timing is not None:
+                        timing.written = time.monotonic()
+                    await conn.drain()
+                    # this is a *request*.  There should be a response.
+                    response = await self._recv(conn, timing)
+                    self.error_check(response.text)
+                finally:
+                    await self._disconnect(conn)
+                return messages.from_response(response) if typed else response.text
+        except CommandError as e:
+            error = e
+            raise
+        finally:
+            if timing is not None:
+                self._report(name, addr, timing, error)
 
 
     async def blink(self, turn_on):
@@ -302,36 +891,69 @@ class GC100:
         The semantics should be obvious, but you can parse each returned device 
         string with 'parse_device()'.
         """
-        async with self._cmd_lock:
-            r, w = await asyncio.open_connection(self._host, self._port)
-            self._partial = b''
-            devices = []
-            endlist = False
-            try:
-                CMD = b'getdevices'+CR
-                w.write(CMD)
-                await w.drain()
-            
-                while not endlist:
-                    response = await self.recv_response(r)
-                    self.error_check(response)
-                    tokens = response.split(SEP)
-                    if tokens[0] == 'endlistdevices':
-                        endlist = True
-                    elif tokens[0] == 'device':
-                        devices.append(response)
-            finally:
-                w.close()
-                await w.wait_closed()
-                await asyncio.sleep(0.01)
-            return devices
+        if self._topology is None:
+            return await self._getdevices()
+        devices = self._topology.get('devices')
+        if devices is None:
+            devices = await self._getdevices()
+            self._topology.put('devices', devices)
+        return list(devices)
+
+    async def _getdevices(self):
+        if not self._coalesce:
+            return await self._call('getdevices', None, self._listdevices)
+        return list(await self._shared(b'getdevices'+CR, 'getdevices', None, self._listdevices))
+
+    async def _listdevices(self):
+        CMD = b'getdevices'+CR
+        timing = self._timing()
+        error = None
+        try:
+            async with self._scheduler.slot(None):
+                if timing is not None:
+                    timing.scheduled = time.monotonic()
+                if self._session is not None:
+                    devices = []
+                    for response in await self._session.request(CMD, until='endlistdevices',
+                                                                timing=timing):
+                        self.error_check(response)
+                        if response.split(SEP)[0] == 'device':
+                            devices.append(response)
+                    return devices
+
+                conn = await self._connect(timing)
+                devices = []
+                endlist = False
+                try:
+                    conn.write(CMD)
+                    if timing is not None:
+                        timing.written = time.monotonic()
+                    await conn.drain()
+
+                    while not endlist:
+                        response = (await self._recv(conn, timing)).text
+                        self.error_check(response)
+                        tokens = response.split(SEP)
+                        if tokens[0] == 'endlistdevices':
+                            endlist = True
+                        elif tokens[0] == 'device':
+                            devices.append(response)
+                finally:
+                    await self._disconnect(conn)
+                return devices
+        except CommandError as e:
+            error = e
+            raise
+        finally:
+            if timing is not None:
+                self._report('getdevices', None, timing, error)
 
 
     async def get_IR(self, addr):
         """Get the current mode setting for a particular port (connector address)"""
         command = f"get_IR,{addr}"
         CMD = bytes(command, encoding='utf8')+CR
-        response = await self.raw_request(CMD)
+        response = await self._cached_request(('IR', addr), CMD)
         return response
     
     async def get_NET(self):
@@ -353,17 +975,18 @@ class GC100:
         """
         command = f"get_SERIAL,{addr}"
         CMD = bytes(command, encoding='utf8')+CR
-        response = await self.raw_request(CMD)
+        response = await self._cached_request(('SERIAL', addr), CMD)
         return response
 
-    async def getstate(self, addr):
+    async def getstate(self, addr, typed=False):
         """Get the current state/value of the digital input on the 'addr' connector port address.
         
-        This returns a 'state' response; use 'parse_state()' to decode it.
+        This returns a 'state' response; use 'parse_state()' to decode it (or,
+        if 'typed', it returns a gc_100.messages.State).
         """
         command = f"getstate,{addr}"
         CMD = bytes(command, encoding='utf8')+CR
-        response = await self.raw_request(CMD)
+        response = await self.raw_request(CMD, typed=typed)
         return response
     
     async def getversion(self, module):
@@ -373,17 +996,22 @@ class GC100:
         """
         command = f"getversion,{module}"
         CMD = bytes(command, encoding='utf8')+CR
-        response = await self.raw_request(CMD)
+        response = await self._cached_request(('version', str(module)), CMD)
         return response
 
-    async def sendir(self, addr, freq, code, id=1, count=1, offset=3):
+    async def sendir(self, addr, freq, code, id=None, count=1, offset=3):
         """Send an IR command.
 
         This will construct the command for the designated connector 'addr'
         based on the carrier frequency (in Hz), request ID, repeat count,  
         repeat offset (see the API documentation for details), and the on/off 
         code pattern.
+
+        If 'id' is None, the next request ID is assigned (see 'next_id()').
+        This returns the 'completeir' response, once the IR has been sent.
         """
+        if id is None:
+            id = self.next_id()
         CMD = self.format_sendir(addr, freq, code, id, count, offset)
         response = await self.raw_request(CMD)
         return response
@@ -411,7 +1039,11 @@ class GC100:
         """
         command = f"set_IR,{addr},{mode}"
         CMD = bytes(command, encoding='utf8')+CR
-        await self.raw_command(CMD)
+        try:
+            await self.raw_command(CMD)
+        finally:
+            if self._topology is not None:
+                self._topology.invalidate(('IR', addr))
         
     async def set_NET(self):
         """[Don't] set the device network configuration.
@@ -433,14 +1065,19 @@ class GC100:
         """
         command = f"set_SERIAL,{addr},{baudrate},{'FLOW_HARDWARE' if flowcontrol else 'FLOW_NONE'},{parity}"
         CMD = bytes(command, encoding='utf8')+CR
-        await self.raw_command(CMD)
+        try:
+            await self.raw_command(CMD)
+        finally:
+            if self._topology is not None:
+                self._topology.invalidate(('SERIAL', addr))
 
     async def stopir(self, addr):
         """Stop the currently running (repeated) IR command on connector port 'addr'.
 
         This is largely pointless with ephemeral connections, as you can't make a new connection 
         to send it while the existing 'sendir' command is still running.
-        This is here for completeness.
+        With a persistent connection, it is sent immediately (while 'sendir' is still
+        waiting for 'completeir').  See also 'IR_out.start_hold()'.
         """
         command = f"stopir,{addr}"
         CMD = bytes(command, encoding='utf8')+CR
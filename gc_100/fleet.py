@@ -0,0 +1,177 @@
+"""Coordinated control of many GC-100 devices"""
+
+import asyncio
+import time
+
+from . import core
+
+
+class Result:
+    """The outcome of a fleet operation on one unit.
+
+    Either 'value' (what the operation returned) or 'error' (the exception it
+    raised) is set; 'seconds' is how long it took.
+    """
+
+    __slots__ = ('name', 'value', 'error', 'seconds')
+
+    def __init__(self, name, value=None, error=None, seconds=0.0):
+        self.name = name
+        self.value = value
+        self.error = error
+        self.seconds = seconds
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        if self.ok:
+            return f"Result({self.name!r}, value={self.value!r})"
+        return f"Result({self.name!r}, error={self.error!r})"
+
+
+class _Health:
+    __slots__ = ('calls', 'failures', 'consecutive', 'total_seconds', 'last_seconds',
+                 'last_error', 'last_ok')
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.consecutive = 0
+        self.total_seconds = 0.0
+        self.last_seconds = None
+        self.last_error = None
+        self.last_ok = None
+
+
+class GC100Fleet:
+    """A named collection of GC-100 units, operated on together.
+
+    Operations fan out to every unit (or a named subset) at once, limited to
+    'concurrency' operations in total and 'per_host' operations on any one unit.
+    Each unit's result (or error) is collected separately; one unit failing
+    doesn't affect the others.
+
+    Units are ordinary GC100 objects.  By default they're created with persistent
+    connections, so repeated operations don't reconnect every time; or you can
+    add your own.
+    """
+
+    def __init__(self, concurrency=64, per_host=4, persistent=True):
+        self._concurrency = asyncio.Semaphore(concurrency)
+        self._per_host = per_host
+        self._persistent = persistent
+        self._units = {}
+        self._host_limits = {}
+        self._health = {}
+
+    def add(self, name, host, port=core.DEFAULT_PORT, gc100=None):
+        """Register a unit as 'name'; returns its GC100 object.
+
+        If 'gc100' is given, it's used as-is (with its own connection strategy).
+        """
+        if name in self._units:
+            raise ValueError(f"duplicate unit name: {name}")
+        if gc100 is None:
+            gc100 = core.GC100(host, port, persistent=self._persistent)
+        self._units[name] = gc100
+        self._health[name] = _Health()
+        if gc100.host() not in self._host_limits:
+            self._host_limits[gc100.host()] = asyncio.Semaphore(self._per_host)
+        return gc100
+
+    async def remove(self, name):
+        """Unregister (and close) unit 'name'."""
+        gc100 = self._units.pop(name)
+        del self._health[name]
+        await gc100.close()
+
+    def __getitem__(self, name):
+        return self._units[name]
+
+    def __contains__(self, name):
+        return name in self._units
+
+    def __len__(self):
+        return len(self._units)
+
+    def names(self):
+        return list(self._units)
+
+    async def close(self):
+        """Close every unit's connection(s)."""
+        await asyncio.gather(*(gc100.close() for gc100 in self._units.values()),
+                             return_exceptions=True)
+
+    async def run(self, operation, names=None, timeout=None):
+        """Run 'operation(gc100)' (a coroutine function) on each unit, concurrently.
+
+        Returns a dict of Result, by unit name, for every unit in 'names' (default: all).
+        If 'timeout' is given, each unit's commands must finish within that many
+        seconds (of starting on that unit); otherwise they fail with CommandTimeout.
+        """
+        if names is None:
+            names = list(self._units)
+        results = await asyncio.gather(*(self._run_one(name, operation, timeout)
+                                         for name in names))
+        return dict(zip(names, results))
+
+    async def command(self, method, *args, names=None, timeout=None, **kwargs):
+        """Call GC100 'method' (by name, e.g., 'setstate') with the given arguments on each unit.
+
+        See 'run()'.
+        """
+        return await self.run(lambda gc100: getattr(gc100, method)(*args, **kwargs), names,
+                              timeout)
+
+    async def _run_one(self, name, operation, timeout=None):
+        gc100 = self._units[name]
+        health = self._health[name]
+        async with self._concurrency, self._host_limits[gc100.host()]:
+            t_start = time.monotonic()
+            try:
+                if timeout is None:
+                    value = await operation(gc100)
+                else:
+                    with core.deadline(timeout):
+                        value = await operation(gc100)
+                result = Result(name, value=value)
+            except Exception as e:
+                result = Result(name, error=e)
+            result.seconds = time.monotonic() - t_start
+
+        health.calls += 1
+        health.total_seconds += result.seconds
+        health.last_seconds = result.seconds
+        if result.ok:
+            health.consecutive = 0
+            health.last_ok = time.time()
+        else:
+            health.failures += 1
+            health.consecutive += 1
+            health.last_error = result.error
+        return result
+
+    def health(self, name=None):
+        """Return health and timing statistics, by unit name (or for unit 'name').
+
+        For each unit: the number of operations ('calls'), how many failed (in total,
+        and in a row), the last error, when it last succeeded (time.time()), and the
+        mean and last operation times (seconds).
+        """
+        if name is not None:
+            return self._summary(self._health[name])
+        return {name: self._summary(health) for name, health in self._health.items()}
+
+    def _summary(self, health):
+        return {
+            'ok': health.consecutive == 0,
+            'calls': health.calls,
+            'failures': health.failures,
+            'consecutive_failures': health.consecutive,
+            'last_error': health.last_error,
+            'last_ok': health.last_ok,
+            'mean_seconds': health.total_seconds / health.calls if health.calls else None,
+            'last_seconds': health.last_seconds,
+        }
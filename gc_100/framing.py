@@ -0,0 +1,152 @@
+"""Framing (message splitting) for serial data streams"""
+
+import re
+
+# Smallest free space to leave for each read.
+MIN_READ = 4096
+
+
+class Delimiter:
+    """Frames end with 'delimiter' (e.g., b'\\r\\n').
+
+    The delimiter is included in the frame only if 'include' is True.
+    """
+
+    timeout = None
+
+    def __init__(self, delimiter=b'\r', include=False):
+        self._delimiter = bytes(delimiter)
+        self._include = include
+
+    def find(self, buffer, start, end):
+        idx = buffer.find(self._delimiter, start, end)
+        if idx == -1:
+            return None
+        after = idx + len(self._delimiter)
+        return start, after if self._include else idx, after
+
+
+class FixedLength:
+    """Every frame is exactly 'length' bytes."""
+
+    timeout = None
+
+    def __init__(self, length):
+        self._length = length
+
+    def find(self, buffer, start, end):
+        if end - start < self._length:
+            return None
+        return start, start + self._length, start + self._length
+
+
+class LengthPrefix:
+    """Each frame starts with its length: a 'size'-byte unsigned integer.
+
+    'adjust' is added to the length value (e.g., if it counts a trailing
+    checksum that it shouldn't, or omits one that it should).  The length
+    header is included in the frame only if 'include_header' is True.
+    """
+
+    timeout = None
+
+    def __init__(self, size=1, byteorder='big', include_header=False, adjust=0):
+        self._size = size
+        self._byteorder = byteorder
+        self._include_header = include_header
+        self._adjust = adjust
+
+    def find(self, buffer, start, end):
+        body = start + self._size
+        if end < body:
+            return None
+        length = int.from_bytes(buffer[start:body], self._byteorder) + self._adjust
+        if end < body + length:
+            return None
+        return start if self._include_header else body, body + length, body + length
+
+
+class Pattern:
+    """Frames end where the regular expression 'pattern' (bytes) matches.
+
+    The match is included in the frame.  If 'timeout' (seconds) is given, a
+    partial frame is also ended when no more data arrives within that time
+    (for devices which don't reliably terminate their messages).
+    """
+
+    def __init__(self, pattern, timeout=None):
+        self._pattern = re.compile(pattern)
+        self.timeout = timeout
+
+    def find(self, buffer, start, end):
+        match = self._pattern.search(buffer, start, end)
+        if match is None:
+            return None
+        return start, match.end(), match.end()
+
+
+class FrameBuffer:
+    """A reusable, bounded buffer from which frames are split.
+
+    Frames are returned as memoryview slices of the buffer.  Only a trailing
+    partial frame is ever moved (to the front of the buffer), and only when
+    space runs short.  If a partial frame grows beyond 'max_size' bytes, it is
+    discarded (and counted in 'overflows').
+    """
+
+    def __init__(self, max_size=65536):
+        self._max_size = max_size
+        self._buffer = bytearray(min(max_size, MIN_READ) + MIN_READ)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+        self.overflows = 0
+
+    def __len__(self):
+        return self._end - self._start
+
+    def feed(self, data):
+        """Copy 'data' (bytes-like) into the buffer."""
+        n = len(data)
+        if len(self._buffer) - self._end < n:
+            self._make_room(n)
+        self._buffer[self._end:self._end + n] = data
+        self._end += n
+
+    def frames(self, framer):
+        """Generate each complete frame (as a memoryview) found by 'framer'.
+
+        Each frame is only valid until the buffer is next fed.
+        """
+        while self._start < self._end:
+            found = framer.find(self._buffer, self._start, self._end)
+            if found is None:
+                break
+            frame_start, frame_end, self._start = found
+            yield self._view[frame_start:frame_end]
+        if self._start == self._end:
+            self._start = self._end = 0
+        elif self._end - self._start > self._max_size:
+            self.overflows += 1
+            self._start = self._end = 0
+
+    def flush(self):
+        """Return (and discard) any partial frame, as bytes."""
+        data = bytes(self._view[self._start:self._end])
+        self._start = self._end = 0
+        return data
+
+    def _make_room(self, need):
+        pending = self._end - self._start
+        size = len(self._buffer)
+        while size - pending < need:
+            size *= 2
+        if size != len(self._buffer):
+            old = self._buffer
+            self._buffer = bytearray(size)
+            self._buffer[:pending] = old[self._start:self._end]
+            self._view = memoryview(self._buffer)
+        else:
+            self._buffer[:pending] = self._buffer[self._start:self._end]
+        self._start = 0
+        self._end = pending
@@ -0,0 +1,185 @@
+"""Instrumentation (timing and counters) for GC-100 commands"""
+
+import bisect
+import time
+
+
+class CommandTiming:
+    """Progress of a single command: time.monotonic() stamps, None if not reached.
+
+    * start: the command was issued (and queued; see gc_100.scheduler)
+    * scheduled: it was its turn
+    * connected: the connection was opened (or found already open)
+    * written: the command was written
+    * first_byte: the first byte of the (first) response arrived
+    * responded: the complete response arrived
+    * completed: all done (including closing an ephemeral connection)
+    """
+
+    __slots__ = ('start', 'scheduled', 'connected', 'written', 'first_byte', 'responded',
+                 'completed')
+
+    PHASES = (('queue', 'start', 'scheduled'),
+              ('connect', 'scheduled', 'connected'),
+              ('write', 'connected', 'written'),
+              ('first_byte', 'written', 'first_byte'),
+              ('response', 'first_byte', 'responded'),
+              ('close', 'responded', 'completed'),
+              ('total', 'start', 'completed'))
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.scheduled = None
+        self.connected = None
+        self.written = None
+        self.first_byte = None
+        self.responded = None
+        self.completed = None
+
+    def phases(self):
+        """Return {phase: seconds} for each phase reached.
+
+        'first_byte' is the GC-100's processing time (including IR transmission,
+        for 'sendir'), and 'close' is the time taken to close an ephemeral
+        connection.  For commands without a response, 'close' starts once the
+        command is written.
+        """
+        result = {}
+        for phase, begin, end in self.PHASES:
+            if phase == 'close' and self.responded is None:
+                begin = 'written'
+            t0 = getattr(self, begin)
+            t1 = getattr(self, end)
+            if t0 is not None and t1 is not None:
+                result[phase] = t1 - t0
+        return result
+
+
+class Instrument:
+    """Receives instrumentation events from a GC100 (see 'GC100(instrument=...)').
+
+    This one ignores them all; override the events of interest.  Events are
+    called on the event loop, so they should be quick.
+    """
+
+    def connected(self, host, seconds):
+        """A command port connection to 'host' was opened, taking 'seconds'."""
+
+    def reconnected(self, host):
+        """The persistent connection to 'host' was re-established (after breaking)."""
+
+    def command(self, host, name, addr, timing):
+        """Command 'name' (to connector 'addr', or None) finished; see CommandTiming."""
+
+    def command_error(self, host, name, addr, errno):
+        """Command 'name' failed with CommandError 'errno'."""
+
+    def serial_bytes(self, host, addr, sent=0, received=0):
+        """Serial data was sent to (or received from) connector 'addr'."""
+
+
+# Histogram bucket upper bounds, in seconds.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Counts of observed values, by bucket (upper bounds 'buckets'), plus sum and count."""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Generate (upper bound, count of values <= bound), ending with (inf, count)."""
+        total = 0
+        for bound, n in zip(self.buckets + (float('inf'),), self.counts):
+            total += n
+            yield bound, total
+
+
+class Collector(Instrument):
+    """Collects events into histograms and counters; export them with 'prometheus()'.
+
+    Metrics (and labels):
+    * gc100_command_seconds{host,command,addr,phase}: see CommandTiming.phases()
+    * gc100_connect_seconds{host}
+    * gc100_command_errors_total{host,command,errno}
+    * gc100_reconnects_total{host}
+    * gc100_serial_bytes_total{host,addr,direction}
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self._buckets = buckets
+        self.histograms = {}
+        self.counters = {}
+
+    def _observe(self, name, labels, value):
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(self._buckets)
+        histogram.observe(value)
+
+    def _count(self, name, labels, n=1):
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + n
+
+    def connected(self, host, seconds):
+        self._observe('gc100_connect_seconds', (('host', host),), seconds)
+
+    def reconnected(self, host):
+        self._count('gc100_reconnects_total', (('host', host),))
+
+    def command(self, host, name, addr, timing):
+        for phase, seconds in timing.phases().items():
+            self._observe('gc100_command_seconds',
+                          (('host', host), ('command', name), ('addr', addr or ''),
+                           ('phase', phase)),
+                          seconds)
+
+    def command_error(self, host, name, addr, errno):
+        self._count('gc100_command_errors_total',
+                    (('host', host), ('command', name), ('errno', str(errno))))
+
+    def serial_bytes(self, host, addr, sent=0, received=0):
+        if sent:
+            self._count('gc100_serial_bytes_total',
+                        (('host', host), ('addr', addr), ('direction', 'out')), sent)
+        if received:
+            self._count('gc100_serial_bytes_total',
+                        (('host', host), ('addr', addr), ('direction', 'in')), received)
+
+    def prometheus(self):
+        """Return all metrics, in the Prometheus text exposition format."""
+        lines = []
+        for name in sorted({name for name, labels in self.histograms}):
+            lines.append(f"# TYPE {name} histogram")
+            for (metric, labels), histogram in sorted(self.histograms.items()):
+                if metric != name:
+                    continue
+                for bound, total in histogram.cumulative():
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {total}")
+                lines.append(f"{name}_sum{_labels(labels)} {histogram.sum!r}")
+                lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        for name in sorted({name for name, labels in self.counters}):
+            lines.append(f"# TYPE {name} counter")
+            for (metric, labels), value in sorted(self.counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_labels(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    def escape(value):
+        return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+    return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in labels) + '}'
@@ -0,0 +1,207 @@
+"""IR code formats: Pronto hex, and GC-100 'sendir' timings (plain and compressed)
+
+The GC-100 'sendir' command takes a carrier frequency (Hz), a repeat offset,
+and a list of on/off durations ("timings"), each counted in carrier periods.
+Learned Pronto codes ("0000 ...") count in carrier periods too, so converting
+between the two only changes how the frequency and the repeated part are given:
+
+    freq, timings, offset = ircode.from_pronto(PRONTO)
+    await gc.sendir('2:1', freq, timings, offset=offset)
+
+Global Cache's compressed format replaces repeats of the first 15 distinct
+on/off pairs by the letters 'A'-'O' (e.g., "342,171,21,21,21,64BBCB,21,1500");
+see 'compress()' and 'parse_timings()'.
+
+For converting whole libraries, 'from_pronto_all()' uses NumPy, if it's installed.
+"""
+
+import re
+import sys
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from . import core
+
+# Pronto frequency words are in units of this many microseconds.
+PRONTO_CLOCK = 0.241246
+
+# The most transitions (on and off durations) in one 'sendir'.
+MAX_TRANSITIONS = 256
+
+# Compressed timings: letters for the first distinct on/off pairs.
+LETTERS = 'ABCDEFGHIJKLMNO'
+
+_TOKEN = re.compile(r'\d+|[A-O]')
+_COMPRESSED = re.compile(r'[\d,A-O\s]*')
+
+
+def check(timings, offset=1):
+    """Check 'timings' (a list of ints) and repeat 'offset' against the GC-100's limits.
+
+    Raises CommandError (8, 9 or 10), as the GC-100 would, but without sending anything.
+    (Errors 15 and 16 are the same limits, reported while IR is being sent, so
+    they're prevented too.)
+    """
+    if offset % 2 == 0:
+        raise core.CommandError(8)
+    if len(timings) > MAX_TRANSITIONS:
+        raise core.CommandError(9)
+    if len(timings) % 2:
+        raise core.CommandError(10)
+    if not 1 <= offset <= max(len(timings), 1):
+        raise ValueError(f"repeat offset {offset} is outside the {len(timings)} timings")
+
+
+def timing_string(timings):
+    """Return 'timings' formatted for 'sendir' (e.g., "342,171,21,21")."""
+    return ','.join(map(str, timings))
+
+
+def parse_timings(code):
+    """Return the list of timings in 'sendir' 'code', which may be compressed."""
+    if not _COMPRESSED.fullmatch(code):
+        raise ValueError(f"invalid IR timings: {code!r}")
+    timings = []
+    pairs = []
+    for token in _TOKEN.findall(code):
+        if token.isdigit():
+            timings.append(int(token))
+            if len(timings) % 2 == 0 and len(pairs) < len(LETTERS):
+                pair = (timings[-2], timings[-1])
+                if pair not in pairs:
+                    pairs.append(pair)
+            continue
+        if len(timings) % 2:
+            raise ValueError(f"compressed pair '{token}' splits a pair: {code!r}")
+        index = LETTERS.index(token)
+        if index >= len(pairs):
+            raise ValueError(f"compressed pair '{token}' is not defined yet: {code!r}")
+        timings.extend(pairs[index])
+    return timings
+
+
+def compress(timings):
+    """Return 'timings' in Global Cache's compressed format.
+
+    The first 15 distinct on/off pairs are assigned the letters 'A'-'O', in
+    order of appearance; any later repeats of them are replaced by the letter.
+    """
+    if len(timings) % 2:
+        raise core.CommandError(10)
+    letters = {}
+    parts = []
+    for i in range(0, len(timings), 2):
+        pair = (timings[i], timings[i+1])
+        letter = letters.get(pair)
+        if letter is not None:
+            parts.append(letter)
+            continue
+        if len(letters) < len(LETTERS):
+            letters[pair] = LETTERS[len(letters)]
+        if parts:
+            parts.append(',')
+        parts.append(f"{pair[0]},{pair[1]}")
+    return ''.join(parts)
+
+
+def pronto_frequency(word):
+    """Return the carrier frequency (Hz) of Pronto frequency 'word'."""
+    return round(1000000 / (word * PRONTO_CLOCK))
+
+
+def from_pronto(code):
+    """Convert learned Pronto hex 'code' (e.g., "0000 006D 0022 0002 0157 00AC ...").
+
+    Returns (freq, timings, offset) for 'sendir': the once-only burst is sent
+    first, and repeats (count > 1) start at the repeated burst.
+    """
+    words = _words(bytes.fromhex(code))
+    return _from_pronto(words, 0, len(words), code)
+
+
+def to_pronto(freq, timings, offset=1):
+    """Convert 'sendir' 'freq', 'timings' and repeat 'offset' to Pronto hex.
+
+    The timings before 'offset' are the once-only burst; the rest are repeated.
+    (So with offset 1, the whole code is the repeated burst.)
+    """
+    if isinstance(timings, str):
+        timings = parse_timings(timings)
+    check(timings, offset)
+    once = (offset - 1) // 2
+    repeat = len(timings) // 2 - once
+    word = round(1000000 / (freq * PRONTO_CLOCK))
+    return ' '.join(f"{w:04X}" for w in (0, word, once, repeat, *timings))
+
+
+def from_pronto_all(codes):
+    """Convert many Pronto hex 'codes' (see 'from_pronto()'); return a list of results.
+
+    All the codes are decoded together, with NumPy if it's available.
+    """
+    raws = [bytes.fromhex(code) for code in codes]
+    words = _words(b''.join(raws))
+    starts = []
+    start = 0
+    for raw, code in zip(raws, codes):
+        if len(raw) % 2:
+            raise ValueError(f"Pronto code has an odd number of hex digits: {code!r}")
+        starts.append(start)
+        start += len(raw) // 2
+    if numpy is None:
+        return [_from_pronto(words, start, start + len(raw) // 2, code)
+                for start, raw, code in zip(starts, raws, codes)]
+
+    # Check the headers and convert the frequencies all at once.
+    starts = numpy.array(starts, dtype=numpy.intp)
+    ends = starts + numpy.array([len(raw) // 2 for raw in raws], dtype=numpy.intp)
+    short = ends - starts < 4
+    if short.any():
+        bad = codes[int(numpy.argmax(short))]
+        raise ValueError(f"Pronto code is too short: {bad!r}")
+    header = words[starts[:, None] + numpy.arange(4)].astype(numpy.intp)
+    lengths = 4 + 2 * (header[:, 2] + header[:, 3])
+    bad = (header[:, 0] != 0) | (header[:, 1] == 0) | (lengths != ends - starts)
+    if bad.any():
+        index = int(numpy.argmax(bad))
+        _from_pronto(words.tolist(), int(starts[index]), int(ends[index]), codes[index])
+    freqs = numpy.rint(1000000 / (header[:, 1] * PRONTO_CLOCK)).astype(int).tolist()
+    offsets = numpy.where(header[:, 3] > 0, 2 * header[:, 2] + 1, 1).tolist()
+    results = []
+    for freq, offset, start, end in zip(freqs, offsets, starts.tolist(), ends.tolist()):
+        timings = words[start+4:end].tolist()
+        check(timings, offset)
+        results.append((freq, timings, offset))
+    return results
+
+
+def _words(data):
+    """Return the big-endian 16-bit words in 'data'."""
+    if len(data) % 2:
+        raise ValueError("Pronto code has an odd number of hex digits")
+    if numpy is not None:
+        return numpy.frombuffer(data, dtype='>u2')
+    words = array('H', data)
+    if sys.byteorder == 'little':
+        words.byteswap()
+    return words
+
+
+def _from_pronto(words, start, end, code):
+    if end - start < 4:
+        raise ValueError(f"Pronto code is too short: {code!r}")
+    kind, word, once, repeat = (int(w) for w in words[start:start+4])
+    if kind != 0:
+        raise ValueError(f"unsupported Pronto code (not learned, '0000'): {code!r}")
+    if word == 0:
+        raise ValueError(f"Pronto code has no carrier frequency: {code!r}")
+    if end - start != 4 + 2 * (once + repeat):
+        raise ValueError(f"Pronto code length doesn't match its header: {code!r}")
+    timings = [int(w) for w in words[start+4:end]]
+    offset = 2 * once + 1 if repeat else 1
+    check(timings, offset)
+    return pronto_frequency(word), timings, offset
@@ -0,0 +1,208 @@
+"""IR code library: many IR codes, stored compactly, looked up by name
+
+Codes are named by brand, device and function (e.g., 'Sony', 'TV', 'power').
+Their timings are kept in one array of 16-bit values, and identical timing
+sequences (common across models of the same brand) are stored once.
+
+A library can be saved to a file, and opened again (memory-mapped) without
+reading or parsing the codes:
+
+    library = IRLibrary()
+    for (brand, device, function), pronto in codes.items():
+        library.add_pronto(brand, device, function, pronto)
+    library.save('codes.gcir')
+
+    library = IRLibrary.open('codes.gcir')
+    await tv.send_code(library, 'Sony', 'TV', 'power')
+
+Ready-to-send 'sendir' commands are made when first used, and the most recently
+used ('cache_size') are kept, per connector.
+"""
+
+import collections
+import json
+import mmap
+import struct
+import sys
+from array import array
+
+from . import ircode
+from .core import CR
+
+MAGIC = b'GCIR'
+VERSION = 1
+
+# magic, version, (reserved), timings, sequences, codes, names (bytes)
+_HEADER = struct.Struct('<4sHHIIII')
+
+
+class IRLibrary:
+    """A set of IR codes, by (brand, device, function).
+
+    Use 'open()' to load a saved library; it is read-only.
+    """
+
+    def __init__(self, cache_size=1024):
+        self._cache_size = cache_size
+        self._commands = collections.OrderedDict()
+        self._mmap = None
+        # all timing sequences, end to end
+        self._timings = array('H')
+        # each sequence: where it starts in '_timings', and its length
+        self._starts = array('I')
+        self._lengths = array('I')
+        # each code: carrier frequency, sequence, repeat offset
+        self._freqs = array('I')
+        self._sequences = array('I')
+        self._offsets = array('I')
+        # {brand: {device: {function: code}}}
+        self._names = {}
+        # sequence numbers, by timings (only while adding)
+        self._unique = {}
+
+    @classmethod
+    def open(cls, path, cache_size=1024):
+        """Open a library saved with 'save()'."""
+        library = cls(cache_size)
+        with open(path, 'rb') as f:
+            library._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(library._mmap)
+        magic, version, _, timings, sequences, codes, names = _HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"not an IR library (version {VERSION}): {path}")
+        offset = _HEADER.size
+
+        def section(code, count):
+            nonlocal offset
+            size = count * (2 if code == 'H' else 4)
+            data = view[offset:offset+size]
+            offset += size + (-size % 4)
+            if sys.byteorder == 'little':
+                return data.cast(code)
+            swapped = array(code, data)
+            swapped.byteswap()
+            return swapped
+
+        library._timings = section('H', timings)
+        library._starts = section('I', sequences)
+        library._lengths = section('I', sequences)
+        library._freqs = section('I', codes)
+        library._sequences = section('I', codes)
+        library._offsets = section('I', codes)
+        library._names = json.loads(bytes(view[offset:offset+names]))
+        library._unique = None
+        return library
+
+    def save(self, path):
+        """Write the library to 'path' (see 'open()')."""
+        names = json.dumps(self._names, separators=(',', ':')).encode('utf8')
+        with open(path, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, 0, len(self._timings), len(self._starts),
+                                 len(self._freqs), len(names)))
+            for values, code in ((self._timings, 'H'), (self._starts, 'I'),
+                                 (self._lengths, 'I'), (self._freqs, 'I'),
+                                 (self._sequences, 'I'), (self._offsets, 'I')):
+                data = array(code, values)
+                if sys.byteorder != 'little':
+                    data.byteswap()
+                data = data.tobytes()
+                f.write(data + bytes(-len(data) % 4))
+            f.write(names)
+
+    def close(self):
+        """Close the file of an opened library."""
+        if self._mmap is None:
+            return
+        for name in ('_timings', '_starts', '_lengths', '_freqs', '_sequences', '_offsets'):
+            values = getattr(self, name)
+            if isinstance(values, memoryview):
+                values.release()
+            setattr(self, name, array('H' if name == '_timings' else 'I'))
+        self._commands.clear()
+        self._mmap.close()
+        self._mmap = None
+
+    def add(self, brand, device, function, freq, timings, offset=1):
+        """Add (or replace) a code; 'timings' is a 'sendir' timing string or a list.
+
+        The timings are checked (see gc_100.ircode.check()).
+        """
+        if self._unique is None:
+            raise ValueError("an opened IR library is read-only")
+        if isinstance(timings, str):
+            timings = ircode.parse_timings(timings)
+        ircode.check(timings, offset)
+        if any(t > 0xFFFF for t in timings):
+            raise ValueError("IR timings must be less than 65536")
+        data = array('H', timings)
+        key = data.tobytes()
+        sequence = self._unique.get(key)
+        if sequence is None:
+            sequence = len(self._starts)
+            self._unique[key] = sequence
+            self._starts.append(len(self._timings))
+            self._lengths.append(len(data))
+            self._timings.extend(data)
+        functions = self._names.setdefault(brand, {}).setdefault(device, {})
+        code = functions.get(function)
+        if code is None:
+            code = len(self._freqs)
+            functions[function] = code
+            self._freqs.append(freq)
+            self._sequences.append(sequence)
+            self._offsets.append(offset)
+        else:
+            self._freqs[code] = freq
+            self._sequences[code] = sequence
+            self._offsets[code] = offset
+            self._commands.clear()
+
+    def add_pronto(self, brand, device, function, code):
+        """Add a learned Pronto hex code (see gc_100.ircode.from_pronto())."""
+        self.add(brand, device, function, *ircode.from_pronto(code))
+
+    def __len__(self):
+        return len(self._freqs)
+
+    def sequences(self):
+        """Return the number of distinct timing sequences stored."""
+        return len(self._starts)
+
+    def brands(self):
+        return list(self._names)
+
+    def devices(self, brand):
+        return list(self._names.get(brand, ()))
+
+    def functions(self, brand, device):
+        return list(self._names.get(brand, {}).get(device, ()))
+
+    def get(self, brand, device, function):
+        """Return (freq, timings, offset) of a code; raise KeyError if there isn't one."""
+        code = self._code(brand, device, function)
+        sequence = self._sequences[code]
+        start = self._starts[sequence]
+        timings = self._timings[start:start+self._lengths[sequence]].tolist()
+        return self._freqs[code], timings, self._offsets[code]
+
+    def command(self, addr, brand, device, function, count=1, id=1):
+        """Return the 'sendir' command (bytes, for 'IR_out.sendir_raw()') for a code."""
+        code = self._code(brand, device, function)
+        key = (addr, code, count, id)
+        command = self._commands.get(key)
+        if command is not None:
+            self._commands.move_to_end(key)
+            return command
+        freq, timings, offset = self.get(brand, device, function)
+        command = bytes(f"sendir,{addr},{id},{freq},{count},{offset},"
+                        f"{ircode.timing_string(timings)}", encoding='utf8')+CR
+        self._commands[key] = command
+        if len(self._commands) > self._cache_size:
+            self._commands.popitem(last=False)
+        return command
+
+    def _code(self, brand, device, function):
+        try:
+            return self._names[brand][device][function]
+        except KeyError:
+            raise KeyError((brand, device, function)) from None
@@ -0,0 +1,169 @@
+"""IR macros: timed sequences of IR commands, delays, and relay actions
+
+A macro is a list of steps, e.g., for "power on the TV, wait 4 s, select HDMI2,
+volume up x5":
+
+    scene = Macro(gc, [
+        Send('2:1', 38000, POWER),
+        Wait(4.0),
+        Send('2:1', 38000, HDMI2),
+        Wait(0.5),
+        Send('2:1', 38000, VOLUME_UP, count=5),
+        SetState('3:1', True),
+    ])
+    await scene.run()
+
+Every command is formatted once, when the macro is created, and reused for each run.
+"""
+
+import asyncio
+import time
+
+from .core import CR
+
+# Compiled step kinds
+IR = 'ir'
+RELAY = 'relay'
+WAIT = 'wait'
+
+
+class Send:
+    """Send IR 'code' at 'freq' Hz (see 'GC100.sendir()').
+
+    If 'addr' is None, the macro's connector address is used (see IR_out.macro()).
+    """
+
+    def __init__(self, addr, freq, code, count=1, offset=3):
+        self.addr = addr
+        self.freq = freq
+        self.code = code
+        self.count = count
+        self.offset = offset
+
+
+class Wait:
+    """Wait until 'seconds' after the previous Wait (or the start of the macro).
+
+    The time taken by commands in between counts towards the wait, so that
+    the macro keeps to its schedule however long the commands take.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+
+class SetState:
+    """Set relay (or digital output) 'addr' to 'active' (see 'GC100.setstate()')."""
+
+    def __init__(self, addr, active):
+        self.addr = addr
+        self.active = active
+
+
+class Macro:
+    """A sequence of steps (Send, Wait, SetState) to run on GC-100 'gc100'.
+
+    Steps run one after another.  To run sequences on different connectors at the
+    same time, make a macro for each and use 'run_all()'.  Cancelling a running
+    macro (see 'cancel()') stops any IR it is sending (with 'stopir').
+
+    'late' is the most that any Wait (in the last run) started behind schedule,
+    in seconds; i.e., by how much the commands before it overran.
+    """
+
+    def __init__(self, gc100, steps, addr=None):
+        self._gc100 = gc100
+        self._program = [self._compile(step, addr) for step in steps]
+        self._task = None
+        self._sending = set()
+        self.late = 0.0
+
+    def _compile(self, step, addr):
+        if isinstance(step, Wait):
+            return WAIT, None, step.seconds
+        if isinstance(step, Send):
+            addr = step.addr or addr
+            if addr is None:
+                raise ValueError("IR step without a connector address")
+            data = self._gc100.format_sendir(addr, step.freq, step.code, self._gc100.next_id(),
+                                             step.count, step.offset)
+            return IR, addr, data
+        if isinstance(step, SetState):
+            data = bytes(f"setstate,{step.addr},{1 if step.active else 0}", encoding='utf8')+CR
+            return RELAY, step.addr, data
+        raise TypeError(f"unknown macro step: {step!r}")
+
+    def duration(self):
+        """Return the total of the macro's Waits (the least time it can take), in seconds."""
+        return sum(arg for kind, addr, arg in self._program if kind == WAIT)
+
+    def is_running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self, start=None):
+        """Start running the macro (see 'run()'); return its task."""
+        self._task = asyncio.ensure_future(self.run(start))
+        return self._task
+
+    async def cancel(self):
+        """Stop the macro started with 'start()' (including any IR it is sending)."""
+        if self._task is None:
+            return
+        task = self._task
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def run(self, start=None):
+        """Run the macro, scheduled from 'start' (time.monotonic(); default now).
+
+        If it's cancelled, any IR it is sending is stopped.
+        """
+        t = time.monotonic() if start is None else start
+        self.late = 0.0
+        try:
+            for kind, addr, arg in self._program:
+                if kind == WAIT:
+                    t += arg
+                    delay = t - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    else:
+                        self.late = max(self.late, -delay)
+                    continue
+                if kind == IR:
+                    # (still sending, if cancelled meanwhile)
+                    self._sending.add(addr)
+                    await self._gc100.raw_request(arg)
+                    self._sending.discard(addr)
+                else:
+                    await self._gc100.raw_request(arg)
+        except asyncio.CancelledError:
+            await self._stop()
+            raise
+        finally:
+            self._sending.clear()
+
+    async def _stop(self):
+        addrs = list(self._sending)
+        self._sending.clear()
+        await asyncio.gather(*(self._gc100.stopir(addr) for addr in addrs),
+                             return_exceptions=True)
+
+
+async def run_all(*macros):
+    """Run 'macros' at the same time, on a common schedule.
+
+    If any fails, the others are cancelled (stopping their IR), and the error is raised.
+    """
+    start = time.monotonic()
+    tasks = [asyncio.ensure_future(macro.run(start)) for macro in macros]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
@@ -0,0 +1,198 @@
+"""Typed GC-100 responses
+
+'parse()' turns any response line into a small object of the matching class,
+looking only at the leading token to decide which:
+
+    message = messages.parse('state,4:1,1')   # State(addr='4:1', state=1)
+    if isinstance(message, messages.State) and message.state:
+        ...
+
+Responses read from the GC-100 (gc_100.protocol.Response) already know their
+leading token; 'from_response()' uses it, rather than looking again.
+
+Each message keeps the original line as 'text' (and 'str()' returns it), and
+'as_dict()' returns the same dict as the matching 'GC100.parse_*()' method.
+"""
+
+from . import protocol
+
+
+class Message:
+    """A response line that isn't otherwise understood."""
+
+    __slots__ = ('text',)
+    kind = None
+
+    def __init__(self, text):
+        self.text = text
+
+    def fields(self):
+        names = [name for cls in reversed(type(self).__mro__[:-2])
+                 for name in cls.__slots__]
+        return {name: getattr(self, name) for name in names}
+
+    def as_dict(self):
+        return self.fields()
+
+    def __str__(self):
+        return self.text
+
+    def __eq__(self, other):
+        return type(other) is type(self) and other.text == self.text
+
+    def __hash__(self):
+        return hash(self.text)
+
+    def __repr__(self):
+        if type(self) is Message:
+            return f"Message({self.text!r})"
+        values = ', '.join(f"{name}={value!r}" for name, value in self.fields().items())
+        return f"{type(self).__name__}({values})"
+
+
+class Device(Message):
+    """'device,<module>,<type>' (from 'getdevices')"""
+    __slots__ = ('module', 'type')
+    kind = 'device'
+
+    def __init__(self, text, tokens):
+        self.text = text
+        self.module = int(tokens[1])
+        self.type = tokens[2]
+
+
+class EndListDevices(Message):
+    """'endlistdevices' (the end of 'getdevices')"""
+    __slots__ = ()
+    kind = 'endlistdevices'
+
+    def __init__(self, text, tokens):
+        self.text = text
+
+
+class IRMode(Message):
+    """'IR,<addr>,<mode>' (from 'get_IR' or 'set_IR')"""
+    __slots__ = ('addr', 'mode')
+    kind = 'IR'
+
+    def __init__(self, text, tokens):
+        self.text = text
+        self.addr = tokens[1]
+        self.mode = tokens[2]
+
+
+class NetConfig(Message):
+    """'NET,0:1,<lock>,<mode>,<ip>,<subnet>,<gateway>' (from 'get_NET')"""
+    __slots__ = ('addr', 'lock', 'mode', 'ip', 'subnet', 'gateway')
+    kind = 'NET'
+
+    def __init__(self, text, tokens):
+        self.text = text
+        self.addr = tokens[1]
+        self.lock = tokens[2]
+        self.mode = tokens[3]
+        self.ip = tokens[4]
+        self.subnet = tokens[5]
+        self.gateway = tokens[6]
+
+
+class SerialConfig(Message):
+    """'SERIAL,<addr>,<baud>,<flow>,<parity>' (from 'get_SERIAL' or 'set_SERIAL')"""
+    __slots__ = ('addr', 'baud', 'flow', 'parity')
+    kind = 'SERIAL'
+
+    def __init__(self, text, tokens):
+        self.text = text
+        self.addr = tokens[1]
+        self.baud = int(tokens[2])
+        self.flow = tokens[3]
+        self.parity = tokens[4]
+
+
+class State(Message):
+    """'state,<addr>,<0|1>' (from 'getstate' or 'setstate')"""
+    __slots__ = ('addr', 'state')
+    kind = 'state'
+
+    def __init__(self, text, tokens):
+        self.text = text
+        self.addr = tokens[1]
+        self.state = int(tokens[2])
+
+
+class StateChange(State):
+    """'statechange,<addr>,<0|1>' (unsolicited, from a SENSOR_NOTIFY input)"""
+    __slots__ = ()
+    kind = 'statechange'
+
+
+class CompleteIR(Message):
+    """'completeir,<addr>,<id>' (the end of a 'sendir')"""
+    __slots__ = ('addr', 'id')
+    kind = 'completeir'
+
+    def __init__(self, text, tokens):
+        self.text = text
+        self.addr = tokens[1]
+        self.id = int(tokens[2])
+
+
+class Version(Message):
+    """'version,<module>,<text>' (from 'getversion')"""
+    __slots__ = ('module', 'version')
+    kind = 'version'
+
+    def __init__(self, text, tokens):
+        self.text = text
+        self.module = int(tokens[1])
+        self.version = tokens[2]
+
+    def as_dict(self):
+        return {'module': self.module, 'text': self.version}
+
+
+class ErrorMessage(Message):
+    """'unknowncommand <errno>' (see core.CommandError), or an iTach 'ERR_<addr>,<nnn>'
+
+    'addr' is the connector address of an iTach error, if given; otherwise None.
+    """
+    __slots__ = ('errno', 'addr')
+    kind = 'unknowncommand'
+
+    def __init__(self, text, tokens):
+        self.text = text
+        self.errno = int(tokens[-1])
+        self.addr = tokens[0] if len(tokens) > 1 and text.startswith('ERR') else None
+
+
+# The message class for each leading token.
+KINDS = {cls.kind: cls for cls in (Device, EndListDevices, IRMode, NetConfig, SerialConfig,
+                                   State, StateChange, CompleteIR, Version)}
+
+
+def parse(text):
+    """Return the message for response line 'text' (without the CR).
+
+    Lines with an unknown leading token, or that are malformed, are returned as a
+    plain Message.
+    """
+    return from_response(protocol.Response(text))
+
+
+def from_response(response):
+    """Return the message for gc_100.protocol.Response 'response' (as 'parse()')."""
+    kind = response.kind
+    text = response.text
+    if kind == 'unknowncommand':
+        cls, tokens = ErrorMessage, text.split(' ')
+    elif kind.startswith('ERR'):
+        cls, tokens = ErrorMessage, text[4:].rsplit(',', 1)
+    else:
+        cls = KINDS.get(kind)
+        if cls is None:
+            return Message(text)
+        tokens = text.split(',')
+    try:
+        return cls(text, tokens)
+    except (IndexError, ValueError):
+        return Message(text)
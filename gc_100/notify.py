@@ -0,0 +1,112 @@
+"""Fan-out of unsolicited GC-100 state change notifications"""
+
+import asyncio
+
+
+class Subscription:
+    """Asynchronous iterator of state changes (from a Notifier).
+
+    Each change is a dict, as from 'GC100.parse_statechange()': the connector
+    address and new state (integer 0 or 1).
+
+    Changes are queued (up to 'maxsize') until they're read; if the subscriber
+    falls behind, the oldest changes are dropped.  Iteration ends when the
+    subscription is closed.
+    """
+
+    def __init__(self, notifier, addr=None, maxsize=100):
+        self._notifier = notifier
+        self._addr = addr
+        self._queue = asyncio.Queue(maxsize)
+        self._closed = False
+        self.dropped = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._closed and self._queue.empty():
+            raise StopAsyncIteration
+        change = await self._queue.get()
+        if change is None:
+            raise StopAsyncIteration
+        return change
+
+    def close(self):
+        """Stop receiving changes; any iteration in progress ends."""
+        if self._closed:
+            return
+        self._closed = True
+        self._notifier._remove(self)
+        if self._queue.full():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+    def _put(self, change):
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(change)
+
+
+class Notifier:
+    """Distribute state changes to subscribers and listener callbacks.
+
+    Subscribers and listeners either name a connector address (and see only
+    its changes) or use None (and see them all).  Listener callbacks are
+    scheduled on the event loop, so a slow or broken callback doesn't hold
+    up the others.
+
+    The last known state of each connector is kept, so that repeated
+    notifications of the same state (e.g., after resynchronizing) are
+    not passed on.
+    """
+
+    def __init__(self):
+        self._subscriptions = []
+        self._listeners = []
+        self._states = {}
+
+    def active(self):
+        """Is anyone listening?"""
+        return bool(self._subscriptions or self._listeners)
+
+    def addresses(self):
+        """Return the connector addresses of interest (subscribed or seen)."""
+        addrs = set(self._states)
+        addrs.update(s._addr for s in self._subscriptions if s._addr is not None)
+        addrs.update(addr for addr, cb in self._listeners if addr is not None)
+        return addrs
+
+    def subscribe(self, addr=None, maxsize=100):
+        subscription = Subscription(self, addr, maxsize)
+        self._subscriptions.append(subscription)
+        return subscription
+
+    def add_listener(self, callback, addr=None):
+        self._listeners.append((addr, callback))
+
+    def remove_listener(self, callback, addr=None):
+        self._listeners.remove((addr, callback))
+
+    def close(self):
+        """End every subscription (listeners are kept)."""
+        for subscription in list(self._subscriptions):
+            subscription.close()
+
+    def publish(self, change):
+        """Pass 'change' on, unless it's already the known state."""
+        addr = change['addr']
+        if self._states.get(addr) == change['state']:
+            return
+        self._states[addr] = change['state']
+        for subscription in self._subscriptions:
+            if subscription._addr is None or subscription._addr == addr:
+                subscription._put(change)
+        loop = asyncio.get_running_loop()
+        for listen_addr, callback in self._listeners:
+            if listen_addr is None or listen_addr == addr:
+                loop.call_soon(callback, change)
+
+    def _remove(self, subscription):
+        self._subscriptions.remove(subscription)
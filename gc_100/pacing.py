@@ -0,0 +1,42 @@
+"""Rate limiting (pacing) for data sent to the GC-100"""
+
+import asyncio
+import time
+
+
+class TokenBucket:
+    """A token bucket: 'rate' tokens per second, holding at most 'burst' tokens.
+
+    'acquire(n)' waits until n tokens are available, then takes them.  A request
+    for more than 'burst' tokens waits for a full bucket, and leaves it in debt,
+    so the long-term rate is still respected.
+    """
+
+    def __init__(self, rate, burst=1):
+        self._rate = rate
+        self._burst = burst
+        self._tokens = burst
+        self._stamp = time.monotonic()
+
+    @property
+    def rate(self):
+        return self._rate
+
+    @rate.setter
+    def rate(self, rate):
+        self._refill()
+        self._rate = rate
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._stamp) * self._rate)
+        self._stamp = now
+
+    async def acquire(self, n=1):
+        need = min(n, self._burst)
+        while True:
+            self._refill()
+            if self._tokens >= need:
+                self._tokens -= n
+                return
+            await asyncio.sleep((need - self._tokens) / self._rate)
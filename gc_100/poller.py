@@ -0,0 +1,171 @@
+"""Adaptive polling of digital inputs (that can't use SENSOR_NOTIFY)"""
+
+import asyncio
+import heapq
+import itertools
+import time
+
+from . import messages
+from . import notify
+from .pacing import TokenBucket
+
+
+class _Input:
+    __slots__ = ('addr', 'interval', 'state', 'removed')
+
+    def __init__(self, addr, interval):
+        self.addr = addr
+        self.interval = interval
+        self.state = None
+        self.removed = False
+
+
+class _Unit:
+    """The inputs polled on one GC-100, and when each is next due."""
+
+    def __init__(self, gc100):
+        self.gc100 = gc100
+        self.inputs = {}
+        self.due = []  # heap of (time, sequence, _Input)
+        self.wakeup = asyncio.Event()
+        self.notifier = notify.Notifier()
+        self.task = None
+
+
+class InputPoller:
+    """Poll digital inputs ('getstate') on any number of GC-100s, and report changes.
+
+    Each input is polled on its own schedule: every 'min_interval' seconds
+    just after it changes, slowing down (by 'backoff' each time) to every
+    'max_interval' seconds while it stays the same.  All the inputs that are
+    due on a unit are polled together, as one batch of pipelined requests;
+    so, give it GC100 objects with persistent connections, and each unit is
+    polled over a single connection.
+
+    In total, no more than 'rate' polls per second are made.  If that's not
+    enough for the inputs' schedules, they all slow down to share it.  Only the
+    inputs that are due are looked at, so adding inputs doesn't add any work
+    beyond their own polls.
+
+    Changes are reported, per GC-100, as from 'GC100.subscribe()' (the first
+    poll of each input reports its state).
+    """
+
+    def __init__(self, rate=50.0, min_interval=0.1, max_interval=5.0, backoff=1.5):
+        self._budget = TokenBucket(rate, max(1, int(rate)))
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._backoff = backoff
+        self._units = {}
+        self._sequence = itertools.count()
+        self._running = False
+        self.polls = 0
+        self.errors = 0
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def start(self):
+        """Start polling."""
+        self._running = True
+        for unit in self._units.values():
+            self._start_unit(unit)
+
+    async def close(self):
+        """Stop polling (and end all subscriptions)."""
+        self._running = False
+        tasks = [unit.task for unit in self._units.values() if unit.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for unit in self._units.values():
+            unit.task = None
+            unit.notifier.close()
+
+    def add(self, gc100, addr):
+        """Poll input 'addr' on GC-100 'gc100' (starting now)."""
+        unit = self._unit(gc100)
+        if addr in unit.inputs:
+            return
+        entry = unit.inputs[addr] = _Input(addr, self._min_interval)
+        self._schedule(unit, entry, time.monotonic())
+        unit.wakeup.set()
+
+    def remove(self, gc100, addr):
+        """Stop polling input 'addr' on 'gc100'."""
+        unit = self._units.get(gc100)
+        entry = unit.inputs.pop(addr, None) if unit is not None else None
+        if entry is not None:
+            entry.removed = True
+
+    def interval(self, gc100, addr):
+        """Return the current polling interval of input 'addr' on 'gc100', in seconds."""
+        return self._units[gc100].inputs[addr].interval
+
+    def subscribe(self, gc100, addr=None, maxsize=100):
+        """Return an asynchronous iterator of changes of 'addr' (or all inputs) on 'gc100'."""
+        return self._unit(gc100).notifier.subscribe(addr, maxsize)
+
+    def add_listener(self, callback, gc100, addr=None):
+        """Call 'callback(change)' for each change of 'addr' (or all inputs) on 'gc100'."""
+        self._unit(gc100).notifier.add_listener(callback, addr)
+
+    def remove_listener(self, callback, gc100, addr=None):
+        self._unit(gc100).notifier.remove_listener(callback, addr)
+
+    def _unit(self, gc100):
+        unit = self._units.get(gc100)
+        if unit is None:
+            unit = self._units[gc100] = _Unit(gc100)
+            if self._running:
+                self._start_unit(unit)
+        return unit
+
+    def _start_unit(self, unit):
+        if unit.task is None:
+            unit.task = asyncio.create_task(self._poll_unit(unit))
+
+    def _schedule(self, unit, entry, when):
+        heapq.heappush(unit.due, (when, next(self._sequence), entry))
+
+    async def _poll_unit(self, unit):
+        while True:
+            now = time.monotonic()
+            batch = []
+            while unit.due and unit.due[0][0] <= now:
+                entry = heapq.heappop(unit.due)[2]
+                if not entry.removed:
+                    batch.append(entry)
+            if not batch:
+                unit.wakeup.clear()
+                delay = unit.due[0][0] - now if unit.due else None
+                try:
+                    await asyncio.wait_for(unit.wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._budget.acquire(len(batch))
+            responses = await asyncio.gather(*(unit.gc100.getstate(entry.addr, typed=True)
+                                               for entry in batch),
+                                             return_exceptions=True)
+            now = time.monotonic()
+            for entry, response in zip(batch, responses):
+                self.polls += 1
+                state = response.state if isinstance(response, messages.State) else None
+                if state is None:
+                    self.errors += 1
+                    entry.interval = min(entry.interval * self._backoff, self._max_interval)
+                elif state != entry.state:
+                    if entry.state is not None:
+                        entry.interval = self._min_interval
+                    entry.state = state
+                    unit.notifier.publish({'addr': entry.addr, 'state': state})
+                else:
+                    entry.interval = min(entry.interval * self._backoff, self._max_interval)
+                if not entry.removed:
+                    self._schedule(unit, entry, now + entry.interval)
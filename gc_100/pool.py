@@ -0,0 +1,159 @@
+"""A pool of persistent connections to one GC-100 (or iTach) command port"""
+
+import asyncio
+import time
+
+# How many command port connections to use, by model.  These are well within
+# what the units accept, leaving some for other clients (and the web interface).
+CONNECTIONS = {
+    'GC-100': 4,
+    'iTach': 8,
+}
+
+# A harmless request, to check that an idle connection still works.
+HEALTH_CHECK = b'getversion,0\r'
+
+
+class SessionPool:
+    """Up to 'size' persistent connections (gc_100.session.Session) to one unit.
+
+    Each request goes to an idle open connection if there is one; otherwise to
+    an idle one that's (re)opened, or a new connection (up to 'size'), or else to
+    the least busy connection (where it's pipelined).  So, independent requests (e.g., 'getstate' on different
+    sensors) run side by side.
+
+    Every 'health_interval' seconds, connections that have been idle that long
+    are checked (with a harmless request); any that don't answer within
+    'health_timeout' seconds are closed and dropped, as are connections that
+    break while in use.  The first connection is kept (and reopened as needed)
+    for unsolicited messages (see 'GC100.subscribe()').
+
+    The pool stands in for a single Session (it has the same methods).
+    'new_session()' makes each connection.
+    """
+
+    def __init__(self, new_session, size, health_interval=30.0, health_timeout=2.0):
+        self._new_session = new_session
+        self._size = size
+        self._health_interval = health_interval
+        self._health_timeout = health_timeout
+        self._sessions = []
+        self._sessions.append(self._add())
+        self._checker = None
+        self.evictions = 0
+
+    def _add(self):
+        session = self._new_session()
+        session.last_used = time.monotonic()
+        if self._sessions:
+            session.on_unsolicited = self._sessions[0].on_unsolicited
+        return session
+
+    @property
+    def on_unsolicited(self):
+        return self._sessions[0].on_unsolicited
+
+    @on_unsolicited.setter
+    def on_unsolicited(self, callback):
+        for session in self._sessions:
+            session.on_unsolicited = callback
+
+    @property
+    def connects(self):
+        return sum(session.connects for session in self._sessions)
+
+    def size(self):
+        """Return the number of connections (open or not) in the pool."""
+        return len(self._sessions)
+
+    def is_open(self):
+        return self._sessions[0].is_open()
+
+    async def open(self):
+        """Open the first connection (see Session.open())."""
+        self._start_checker()
+        await self._sessions[0].open()
+
+    async def wait_closed(self):
+        await self._sessions[0].wait_closed()
+
+    async def close(self):
+        checker = self._checker
+        self._checker = None
+        if checker is not None:
+            checker.cancel()
+            await asyncio.gather(checker, return_exceptions=True)
+        await asyncio.gather(*(session.close() for session in self._sessions))
+        del self._sessions[1:]
+
+    async def send(self, data, timing=None):
+        session = self._choose()
+        try:
+            await session.send(data, timing)
+        except OSError:
+            await self._evict(session)
+            raise
+        finally:
+            session.last_used = time.monotonic()
+
+    async def request(self, data, until=None, timing=None, typed=False):
+        session = self._choose()
+        try:
+            return await session.request(data, until, timing, typed)
+        except OSError:
+            await self._evict(session)
+            raise
+        finally:
+            session.last_used = time.monotonic()
+
+    def _choose(self):
+        self._start_checker()
+        for session in self._sessions:
+            if session.active == 0 and session.is_open():
+                return session
+        # an idle connection that isn't open (yet) opens on demand
+        for session in self._sessions:
+            if session.active == 0:
+                return session
+        if len(self._sessions) < self._size:
+            session = self._add()
+            self._sessions.append(session)
+            return session
+        return min(self._sessions, key=lambda session: session.active)
+
+    async def _evict(self, session):
+        if session is self._sessions[0]:
+            # keep it (it'll reconnect), but start again
+            await session.close()
+            return
+        try:
+            self._sessions.remove(session)
+        except ValueError:
+            return
+        self.evictions += 1
+        await session.close()
+
+    def _start_checker(self):
+        if self._checker is None and self._health_interval is not None:
+            self._checker = asyncio.create_task(self._check_idle())
+
+    async def _check_idle(self):
+        while True:
+            await asyncio.sleep(self._health_interval)
+            now = time.monotonic()
+            idle = [session for session in self._sessions
+                    if session.active == 0 and now - session.last_used >= self._health_interval]
+            await asyncio.gather(*(self._check(session) for session in idle))
+
+    async def _check(self, session):
+        if not session.is_open():
+            # broken (or closed) while idle
+            if session is not self._sessions[0]:
+                await self._evict(session)
+            return
+        try:
+            await asyncio.wait_for(session.request(HEALTH_CHECK), self._health_timeout)
+        except (asyncio.TimeoutError, OSError):
+            await self._evict(session)
+        else:
+            session.last_used = time.monotonic()
@@ -0,0 +1,237 @@
+"""GC-100 command port protocol: response framing"""
+
+import asyncio
+import collections
+import time
+
+# Responses are terminated with CR (0x0d); see core.CR.
+CR = 0x0d
+
+# Smallest free space to offer the transport for each read.
+MIN_READ = 1024
+
+
+class Response:
+    """A single response from the GC-100 (without the trailing CR).
+
+    'kind' is the leading token: the response type ('state', 'completeir',
+    'unknowncommand', etc.).  'text' is the complete response string.
+    'received' is when (time.monotonic()) its first byte arrived, if the
+    connection is timed; otherwise None.
+    """
+
+    __slots__ = ('kind', 'text', 'received')
+
+    def __init__(self, text):
+        self.text = text
+        self.kind = text.partition(',')[0].partition(' ')[0]
+        self.received = None
+
+    def __repr__(self):
+        return f"Response({self.text!r})"
+
+
+class ResponseParser:
+    """Incrementally split a byte stream into CR-terminated responses.
+
+    Data is received directly into a reusable buffer ('get_buffer()' and
+    'buffer_updated()', as for asyncio.BufferedProtocol), or copied in with
+    'feed()'.  Complete responses are decoded straight from the buffer; only
+    a trailing partial response is ever moved (to the front of the buffer),
+    and only when the buffer runs short of space.  The buffer grows as needed
+    to hold a single (long) partial response.
+    """
+
+    def __init__(self, size=4096):
+        self._buffer = bytearray(size)
+        self._view = memoryview(self._buffer)
+        self._start = 0  # first byte not yet parsed
+        self._end = 0    # end of received data
+
+    def get_buffer(self, sizehint=-1):
+        """Return a writable memoryview of (at least) 'sizehint' free bytes."""
+        need = max(sizehint, MIN_READ)
+        if len(self._buffer) - self._end < need:
+            self._make_room(need)
+        return self._view[self._end:]
+
+    def buffer_updated(self, nbytes):
+        """Record that 'nbytes' were written into the last 'get_buffer()'."""
+        self._end += nbytes
+
+    def feed(self, data):
+        """Copy 'data' (bytes-like) into the buffer."""
+        n = len(data)
+        self.get_buffer(n)[:n] = data
+        self._end += n
+
+    def pending(self):
+        """Is there a partial response?"""
+        return self._end > self._start
+
+    def next_response(self):
+        """Return the next complete Response, or None if there isn't one (yet)."""
+        idx = self._buffer.find(CR, self._start, self._end)
+        if idx == -1:
+            if self._start == self._end:
+                self._start = self._end = 0
+            return None
+        text = str(self._view[self._start:idx], 'ascii')
+        self._start = idx + 1
+        return Response(text)
+
+    def responses(self):
+        """Generate each complete response (as a Response) received so far."""
+        while True:
+            response = self.next_response()
+            if response is None:
+                return
+            yield response
+
+    def remainder(self):
+        """Return (and discard) any partial response, as a string."""
+        text = str(self._view[self._start:self._end], 'ascii')
+        self._start = self._end = 0
+        return text
+
+    def _make_room(self, need):
+        pending = self._end - self._start
+        size = len(self._buffer)
+        while size - pending < need:
+            size *= 2
+        if size != len(self._buffer):
+            old = self._buffer
+            self._buffer = bytearray(size)
+            self._buffer[:pending] = old[self._start:self._end]
+            self._view = memoryview(self._buffer)
+        else:
+            self._buffer[:pending] = self._buffer[self._start:self._end]
+        self._start = 0
+        self._end = pending
+
+
+class CommandProtocol(asyncio.BufferedProtocol):
+    """A command port connection, with its own response parser.
+
+    If 'on_response' is given, it is called with each Response as it arrives
+    (and 'on_lost' with the exception, or None, when the connection is lost).
+    Otherwise, responses are queued, to be retrieved (in order) with 'recv()'.
+    If 'timed', each Response records when it started to arrive.
+    """
+
+    def __init__(self, on_response=None, on_lost=None, timed=False):
+        self._parser = ResponseParser()
+        self._timed = timed
+        self._since = None
+        self._on_response = on_response
+        self._on_lost = on_lost
+        self._transport = None
+        self._responses = collections.deque()
+        self._waiter = None
+        self._paused = False
+        self._drain_waiters = collections.deque()
+        self._closed = asyncio.get_running_loop().create_future()
+
+    # asyncio.BufferedProtocol
+
+    def connection_made(self, transport):
+        self._transport = transport
+
+    def get_buffer(self, sizehint):
+        return self._parser.get_buffer(sizehint)
+
+    def buffer_updated(self, nbytes):
+        if self._timed:
+            now = time.monotonic()
+            # a partial response started arriving earlier
+            self._since = self._since if self._parser.pending() else now
+        self._parser.buffer_updated(nbytes)
+        for response in self._parser.responses():
+            if self._timed:
+                response.received = self._since
+                self._since = now
+            if self._on_response is not None:
+                self._on_response(response)
+            else:
+                self._responses.append(response)
+                self._wake()
+
+    def eof_received(self):
+        # close the connection (the GC-100 doesn't half-close)
+        return False
+
+    def connection_lost(self, exc):
+        remainder = self._parser.remainder()
+        if remainder and self._on_response is None:
+            self._responses.append(Response(remainder))
+        if not self._closed.done():
+            self._closed.set_result(exc)
+        self._wake()
+        for waiter in self._drain_waiters:
+            if not waiter.done():
+                waiter.set_exception(ConnectionResetError("GC-100 closed the command connection"))
+        self._drain_waiters.clear()
+        if self._on_lost is not None:
+            self._on_lost(exc)
+
+    def pause_writing(self):
+        self._paused = True
+
+    def resume_writing(self):
+        self._paused = False
+        for waiter in self._drain_waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        self._drain_waiters.clear()
+
+    # Connection
+
+    def is_open(self):
+        return not self._closed.done() and not self._transport.is_closing()
+
+    def write(self, data):
+        self._transport.write(data)
+
+    async def drain(self):
+        """Wait until it's OK to write more (see asyncio.StreamWriter.drain())."""
+        if self._closed.done():
+            raise ConnectionResetError("GC-100 closed the command connection")
+        if not self._paused:
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._drain_waiters.append(waiter)
+        await waiter
+
+    async def recv(self):
+        """Return the next Response (queued mode only).
+
+        If the connection is closed, this returns an empty Response.
+        """
+        while not self._responses:
+            if self._closed.done():
+                return Response('')
+            self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        return self._responses.popleft()
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+
+    async def wait_closed(self):
+        await asyncio.shield(self._closed)
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+
+async def open_connection(host, port, on_response=None, on_lost=None, timed=False):
+    """Connect to a GC-100 command port; return the CommandProtocol."""
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_connection(
+        lambda: CommandProtocol(on_response, on_lost, timed), host, port)
+    return protocol
@@ -9,9 +9,9 @@ class Digital_In:
 
     The function(s) here are largely pass-through to the core GC100 object.
 
-    Note that this class does not currently support unsolicited 'statechange' messages 
-    from the GC-100.  That would require a [continuously] open TCP connection, which
-    the core library does not maintain.
+    For inputs configured as SENSOR_NOTIFY, use 'subscribe()' or 'add_listener()' to
+    receive unsolicited 'statechange' messages from the GC-100 (instead of polling).
+    That keeps a command port connection open and monitored; see 'GC100.subscribe()'.
     """
 
     def __init__(self, gc100, addr):
@@ -25,7 +25,13 @@ class Digital_In:
         response = await self._gc100.getstate(self._addr)
         return response
 
-    # @todo: async def is_valid(self):  [ensure IR mode is 'SENSOR' or 'SENSOR_NOTIFY'
+    async def is_valid(self):
+        """Is this connector configured as a digital input ('SENSOR' or 'SENSOR_NOTIFY')?
+
+        This is a query, unless the GC100 is caching its configuration.
+        """
+        mode = self.parse_IR(await self.get_IR()).get('mode')
+        return mode in ('SENSOR', 'SENSOR_NOTIFY')
 
     def parse_IR(self, ir):
         return self._gc100.parse_IR(ir)
@@ -33,3 +39,16 @@ class Digital_In:
     def parse_state(self, state):
         return self._gc100.parse_state(state)
 
+    def parse_statechange(self, change):
+        return self._gc100.parse_statechange(change)
+
+    def subscribe(self, maxsize=100):
+        """Return an asynchronous iterator of state changes on this input."""
+        return self._gc100.subscribe(self._addr, maxsize)
+
+    def add_listener(self, callback):
+        self._gc100.add_listener(callback, self._addr)
+
+    def remove_listener(self, callback):
+        self._gc100.remove_listener(callback, self._addr)
+
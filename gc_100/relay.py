@@ -2,6 +2,7 @@
 
 import asyncio
 from . import core
+from . import messages
 
 class Relay:
     """Helper class for operating a relay on a particular GC-100 connector address.
@@ -20,3 +21,117 @@ class Relay:
         response = await self._gc100.setstate(self._addr, active)
         return response
     
+
+    async def getstate(self):
+        response = await self._gc100.getstate(self._addr)
+        return response
+
+
+class RelayBank:
+    """Keep a set of relays on GC-100 'gc100' in the states they're meant to be in.
+
+    The bank remembers each relay's desired state, and its last confirmed
+    state (from the 'state' response to 'setstate').  A relay that's already
+    in the desired state isn't sent anything.  While a relay is being set,
+    further changes just update the desired state; when the command finishes,
+    only the latest is sent (if it's still different).  So, on/off/on in quick
+    succession sends only 'on'.
+
+    A scene (see 'apply()') sets several relays at once, concurrently.
+
+    After the GC-100's persistent connection is re-established (it may have
+    restarted), the relays' states are read back and any that differ from the
+    desired state are set again (see 'reconcile()').
+    """
+
+    def __init__(self, gc100):
+        self._gc100 = gc100
+        self._desired = {}
+        self._confirmed = {}
+        self._writers = {}
+        self._reconciling = None
+        self.writes = 0
+        self.skipped = 0
+        gc100.add_reconnect_listener(self._reconnected)
+
+    def close(self):
+        """Stop reconciling after reconnection."""
+        self._gc100.remove_reconnect_listener(self._reconnected)
+
+    def relay(self, addr):
+        return Relay(self._gc100, addr)
+
+    def desired(self, addr):
+        """Return the desired state (0 or 1) of relay 'addr', or None if it's never been set."""
+        return self._desired.get(addr)
+
+    def state(self, addr):
+        """Return the last confirmed state (0 or 1) of relay 'addr', or None if unknown."""
+        return self._confirmed.get(addr)
+
+    async def setstate(self, addr, active):
+        """Set relay 'addr' (if necessary); return its confirmed state (0 or 1)."""
+        self._desired[addr] = 1 if active else 0
+        writer = self._writers.get(addr)
+        if writer is None:
+            if self._confirmed.get(addr) == self._desired[addr]:
+                self.skipped += 1
+                return self._confirmed[addr]
+            writer = self._writers[addr] = asyncio.ensure_future(self._write(addr))
+        else:
+            self.skipped += 1
+        return await asyncio.shield(writer)
+
+    async def apply(self, scene):
+        """Set several relays at once: 'scene' maps addresses to states.
+
+        Returns their confirmed states (by address).  If any fails, the
+        first error is raised (after they've all finished).
+        """
+        addrs = list(scene)
+        results = await asyncio.gather(*(self.setstate(addr, scene[addr]) for addr in addrs),
+                                       return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return dict(zip(addrs, results))
+
+    async def reconcile(self):
+        """Read back the state of every known relay, and set any that aren't as desired."""
+        addrs = list(self._desired.keys() | self._confirmed.keys())
+        responses = await asyncio.gather(*(self._gc100.getstate(addr, typed=True)
+                                           for addr in addrs),
+                                         return_exceptions=True)
+        for addr, response in zip(addrs, responses):
+            if addr in self._writers:
+                # being set; its response will be more recent
+                continue
+            state = response.state if isinstance(response, messages.State) else None
+            self._confirmed[addr] = state
+        await asyncio.gather(*(self.setstate(addr, state) for addr, state in self._desired.items()
+                               if self._confirmed.get(addr) != state),
+                             return_exceptions=True)
+
+    async def _write(self, addr):
+        try:
+            while self._confirmed.get(addr) != self._desired[addr]:
+                target = self._desired[addr]
+                self.writes += 1
+                try:
+                    response = await self._gc100.setstate(addr, target)
+                except BaseException:
+                    # it may (or may not) have been set
+                    self._confirmed[addr] = None
+                    raise
+                state = self._gc100.parse_state(response).get('state', target)
+                self._confirmed[addr] = state
+                if state != target:
+                    # the GC-100 didn't do as it was told; don't keep insisting
+                    break
+            return self._confirmed[addr]
+        finally:
+            del self._writers[addr]
+
+    def _reconnected(self):
+        if self._reconciling is None or self._reconciling.done():
+            self._reconciling = asyncio.ensure_future(self.reconcile())
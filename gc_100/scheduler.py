@@ -0,0 +1,122 @@
+"""Per-connector command scheduling for a GC-100"""
+
+import asyncio
+import collections
+import contextlib
+
+# Priority lanes (lower is more urgent).
+# URGENT commands (e.g., 'stopir') run immediately, even if their connector is busy;
+# that's the whole point of them.  HIGH commands (e.g., relays) are served before
+# NORMAL ones (e.g., IR).
+URGENT = 0
+HIGH = 1
+NORMAL = 2
+
+
+class Scheduler:
+    """Schedule commands by connector address ('module:port').
+
+    Each connector has its own queue (one lane per priority), and runs one command
+    at a time, in order.  Different connectors run concurrently, up to
+    'concurrency' commands at once.  When there are more connectors with
+    work waiting than free slots, connectors take turns (round-robin), so a
+    busy connector can't starve the others; connectors with HIGH priority
+    work waiting go first.
+
+    Commands that aren't aimed at a particular connector (e.g., 'getdevices')
+    use the address None, which is scheduled like any other connector.
+    """
+
+    def __init__(self, concurrency=1):
+        self._concurrency = concurrency
+        self._running = 0
+        # waiting futures, by connector address: one deque per priority
+        self._queues = {}
+        # connectors currently running a command
+        self._busy = set()
+        # idle connectors with work waiting, in turn order (dict as ordered set)
+        self._ready = {}
+
+    @contextlib.asynccontextmanager
+    async def slot(self, addr, priority=NORMAL):
+        """Run the body (of an 'async with') as a command on connector 'addr'."""
+        await self.acquire(addr, priority)
+        try:
+            yield
+        finally:
+            self.release(addr, priority)
+
+    async def acquire(self, addr, priority=NORMAL):
+        """Wait for a turn on connector 'addr'.  Pair with 'release()'."""
+        if priority == URGENT:
+            return
+        lanes = self._queues.get(addr)
+        if lanes is None:
+            lanes = self._queues[addr] = (collections.deque(), collections.deque(), collections.deque())
+        waiter = asyncio.get_running_loop().create_future()
+        lanes[priority].append(waiter)
+        if addr not in self._busy:
+            self._ready[addr] = True
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # we were given the slot, but can't use it; pass it on.
+                self.release(addr, priority)
+            else:
+                with contextlib.suppress(ValueError):
+                    lanes[priority].remove(waiter)
+                self._tidy(addr)
+            raise
+
+    def release(self, addr, priority=NORMAL):
+        """Finish the current command on connector 'addr'."""
+        if priority == URGENT:
+            return
+        self._busy.discard(addr)
+        self._running -= 1
+        if self._waiting(addr):
+            # back of the line
+            self._ready[addr] = True
+        else:
+            self._tidy(addr)
+        self._dispatch()
+
+    def _waiting(self, addr):
+        lanes = self._queues.get(addr)
+        return lanes is not None and any(lanes)
+
+    def _tidy(self, addr):
+        if not self._waiting(addr):
+            self._ready.pop(addr, None)
+            if addr not in self._busy:
+                self._queues.pop(addr, None)
+
+    def _next(self):
+        """Pick the next connector to run: HIGH priority work first, then round-robin."""
+        for addr in self._ready:
+            if self._queues[addr][HIGH]:
+                return addr
+        return next(iter(self._ready))
+
+    def _dispatch(self):
+        while self._ready and self._running < self._concurrency:
+            addr = self._next()
+            del self._ready[addr]
+            waiter = self._pop(addr)
+            if waiter is None:
+                self._tidy(addr)
+                continue
+            self._busy.add(addr)
+            self._running += 1
+            waiter.set_result(None)
+
+    def _pop(self, addr):
+        """Return the next live waiter for 'addr' (most urgent lane first)."""
+        for lane in self._queues[addr]:
+            while lane:
+                waiter = lane.popleft()
+                if not waiter.done():
+                    return waiter
+        return None
@@ -1,9 +1,57 @@
 """Global Cache GC-100 send (emit) IR commands"""
 
 import asyncio
+import contextlib
 from . import core
+from . import ircode
+from .macro import Macro
+
+# Repeat count for a held button: the most the GC-100 accepts.
+HOLD_COUNT = 31
+
+
+class Hold:
+    """An IR command being repeated while a button is held (see 'IR_out.start_hold()').
+
+    The command is sent once, with a high repeat count; if the button is held
+    for longer than that, it's sent again.  'release()' stops it at once.
+    If a 'sendir' fails, it isn't sent again; 'release()' raises the error.
+    """
+
+    def __init__(self, gc100, addr, cmd):
+        self._gc100 = gc100
+        self._addr = addr
+        self._cmd = cmd
+        self._task = asyncio.ensure_future(self._repeat())
+        self.sent = 0
+
+    def is_held(self):
+        return not self._task.done()
+
+    async def _repeat(self):
+        # (stops at the first error)
+        while True:
+            self.sent += 1
+            await self._gc100.raw_request(self._cmd)
+
+    async def release(self):
+        """Stop sending the IR command (with 'stopir').
+
+        If the command failed meanwhile, this raises its error (e.g., CommandError).
+        """
+        if self._task.done():
+            if not self._task.cancelled() and self._task.exception() is not None:
+                raise self._task.exception()
+            return
+        # Abandon the 'sendir' (whether it's been sent yet, or not), then stop the IR.
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await self._gc100.stopir(self._addr)
 
-# @todo Formatting functions to convert different IR code formats (e.g., Pronto) into GC-100.
 
 class IR_out:
     """Helper class for sending IR commands on a particular GC-100 connector address.
@@ -24,7 +72,13 @@ class IR_out:
     async def get_IR(self):
         return await self._gc100.get_IR(self._addr)
 
-    # @todo: async def is_valid(self):  [ensure IR mode is 'IR' or 'IR_NOCARRIER'
+    async def is_valid(self):
+        """Is this connector configured for IR output ('IR' or 'IR_NOCARRIER')?
+
+        This is a query, unless the GC100 is caching its configuration.
+        """
+        mode = self.parse_IR(await self.get_IR()).get('mode')
+        return mode in ('IR', 'IR_NOCARRIER')
 
     async def sendir_raw(self, cmd):
         """Send a fully constructed IR command.
@@ -38,7 +92,41 @@ class IR_out:
         response = await self._gc100.raw_request(cmd)
         return response # @todo is there any reason to examine/use the response?
 
-    async def sendir(self, freq, code, id=1, count=1, offset=3):
+    async def sendir(self, freq, code, id=None, count=1, offset=3):
         response = await self._gc100.sendir(self._addr, freq, code, id, count, offset)
         return response # @todo ditto.
-        
+
+    async def sendir_pronto(self, code, id=None, count=1):
+        """Send learned Pronto hex 'code' (see gc_100.ircode.from_pronto())."""
+        freq, timings, offset = ircode.from_pronto(code)
+        return await self.sendir(freq, timings, id, count, offset)
+
+    async def send_code(self, library, brand, device, function, count=1):
+        """Send a code from gc_100.irlib.IRLibrary 'library' (see 'IRLibrary.command()')."""
+        return await self.sendir_raw(library.command(self._addr, brand, device, function, count))
+
+    async def start_hold(self, freq, code, offset=3, count=HOLD_COUNT):
+        """Start sending an IR command repeatedly, as for a held button; return a Hold.
+
+        The 'offset' marks the part of the 'code' that repeats (see 'sendir()').
+        Call 'release()' on the Hold to stop.  Use a persistent connection (see
+        GC100), so that 'stopir' goes out immediately.
+        """
+        cmd = self.format_sendir(freq, code, self._gc100.next_id(), count, offset)
+        return Hold(self._gc100, self._addr, cmd)
+
+    @contextlib.asynccontextmanager
+    async def hold(self, freq, code, offset=3, count=HOLD_COUNT):
+        """Send an IR command repeatedly, for the body of an 'async with' (see 'start_hold()').
+
+        With gc_100.sync, use an ordinary 'with'.
+        """
+        held = await self.start_hold(freq, code, offset, count)
+        try:
+            yield held
+        finally:
+            await held.release()
+
+    def macro(self, steps):
+        """Return a Macro of 'steps' (see gc_100.macro); IR steps default to this connector."""
+        return Macro(self._gc100, steps, self._addr)
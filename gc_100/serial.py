@@ -2,6 +2,8 @@
 
 import asyncio
 from . import core
+from .framing import FrameBuffer
+from .pacing import TokenBucket
 
 class SerialError(core.Error):
     # @todo components and/or derived exceptions
@@ -9,50 +11,114 @@ class SerialError(core.Error):
 
 BASE_PORT = 4999
 
+# Serial characters are 10 bits on the wire: start, 8 data, stop.
+BITS_PER_BYTE = 10
+
+# The most time to spend asking for the baud rate (on the command port), in seconds.
+BAUD_QUERY_TIMEOUT = 2.0
 
-class Serial:
-    """Helper class for sending and receiving serial data through GC-100"""
 
-    def __init__(self, gc100, addr, index):
+class Serial:
+    """Helper class for sending and receiving serial data through GC-100
+
+    The GC-100 gets VERY confused if you send packets too quickly.
+    It doesn't seem to correctly ACK retransmissions, eventually timing
+    out and then rebooting.  So, outgoing data is paced:
+    * at most 'max_packets' TCP writes per second, and
+    * no faster than the serial port can send it (baud rate / 10 bytes per second).
+    Data from several 'send()' calls is combined into as few writes as possible.
+
+    The baud rate is read from the GC-100 ('get_SERIAL') on connecting, unless it's
+    given (as 'baudrate') or set through here ('set_SERIAL()').  If it can't be read
+    (e.g., the command port is busy or down), only the packet rate is limited.
+    """
+
+    def __init__(self, gc100, addr, index, baudrate=None, max_packets=100, max_write=1024,
+                 high_water=4096):
         self._gc100 = gc100
         # @todo: lookup connector address from index (or vice versa)
         self._addr = addr
         self._w = None
         self._r = None
         self._port = BASE_PORT + index
+        self._baudrate = baudrate
+        self._packets = TokenBucket(max_packets)
+        self._bytes = None
+        self._max_write = max_write
+        self._high_water = high_water
+        self._pending = bytearray()
+        self._writer = None
+        self._error = None
+        self._below_high_water = asyncio.Event()
+        self._below_high_water.set()
+        self._instrument = gc100.instrument()
 
 
     async def connect(self):
         if self._w is not None:
             # already connected.  may be broken, but already connected.
             return
+        if self._baudrate is None:
+            try:
+                with core.deadline(BAUD_QUERY_TIMEOUT):
+                    self._baudrate = self.parse_SERIAL(await self.get_SERIAL()).get('baud')
+            except (core.Error, OSError):
+                # not a serial port (we'll find out soon enough), or no command port.
+                pass
+        self._set_rate(self._baudrate)
         self._r, self._w = await asyncio.open_connection(self._gc100.host(), self._port)
 
-        
+
     async def disconnect(self):
         if self._w is None:
             # not connected
             return
         try:
-            self._w.close()
-            await self._w.wait_closed()
+            if self._error is None:
+                await self.flush()
+        except Exception:
+            # we're disconnecting anyway.
+            pass
         finally:
-            self._r = None
-            self._w = None
+            await self._close()
+
+
+    async def _close(self):
+        if self._w is None:
+            return
+        w = self._w
+        writer = self._writer
+        self._r = None
+        self._w = None
+        self._writer = None
+        self._pending.clear()
+        self._below_high_water.set()
+        if writer is not None and writer is not asyncio.current_task():
+            writer.cancel()
+        try:
+            w.close()
+            await w.wait_closed()
+        except OSError:
+            pass
+
 
-            
     async def get_SERIAL(self):
         return await self._gc100.get_SERIAL(self._addr)
 
-    
+
     def is_connected(self):
         return self._w is not None
 
-    
+
     def parse_SERIAL(self, serial):
         return self._gc100.parse_SERIAL(serial)
 
-    
+
+    def pending(self):
+        """Return the number of bytes waiting to be sent."""
+        return len(self._pending)
+
+
     async def recv(self, size):
         """Return up to next 'size' bytes"""
         if self._r is None:
@@ -61,30 +127,120 @@ class Serial:
         try:
             data = await self._r.read(size)
             if data:
+                if self._instrument is not None:
+                    self._instrument.serial_bytes(self._gc100.host(), self._addr, received=len(data))
                 return data
             else:
-                await self.disconnect()
+                await self._close()
         except Exception as e:
-            await self.disconnect()
+            await self._close()
             raise e
 
-        
+
+    async def frames(self, framer, max_size=65536, copy=True):
+        """Generate each frame received, as split by 'framer' (see gc_100.framing).
+
+        e.g., "async for line in serial.frames(framing.Delimiter(b'\\r\\n')):"
+
+        Data is collected in one reusable buffer, holding at most 'max_size' bytes
+        of a partial frame (anything longer is discarded).  With 'copy' False,
+        frames are memoryview slices of that buffer, valid only until the next
+        frame is requested.  If the framer has a 'timeout', a partial frame is
+        returned when nothing more arrives within that time.  This ends when the
+        connection is closed.
+        """
+        buffer = FrameBuffer(max_size)
+        timeout = framer.timeout
+        while True:
+            for frame in buffer.frames(framer):
+                yield bytes(frame) if copy else frame
+            if timeout is not None and len(buffer):
+                try:
+                    data = await asyncio.wait_for(self.recv(max_size), timeout)
+                except asyncio.TimeoutError:
+                    yield buffer.flush()
+                    continue
+            else:
+                data = await self.recv(max_size)
+            if not data:
+                return
+            buffer.feed(data)
+
+
     async def send(self, msg):
-        """Send 'msg' (in bytes)"""
+        """Send 'msg' (in bytes)
+
+        The data is queued, to be written as soon as the pacing allows.  If too much
+        data is already waiting (more than 'high_water' bytes), this waits for some
+        of it to be sent.  Use 'flush()' to wait for everything to be sent.
+        """
         if self._w is None:
             raise SerialError("not connected")
+        self._raise_error()
+
+        self._pending += msg
+        if self._writer is None:
+            self._error = None
+            self._writer = asyncio.create_task(self._write_pending())
+        if len(self._pending) > self._high_water:
+            self._below_high_water.clear()
+            await self._below_high_water.wait()
+            self._raise_error()
+
+
+    async def flush(self):
+        """Wait until all queued data has been sent."""
+        if self._writer is not None:
+            await asyncio.wait([self._writer])
+        self._raise_error()
 
-        try:
-            self._w.write(msg)
-            await self._w.drain()
-            # The GC-100 gets VERY confused if you send packets too quickly.
-            # It doesn't seem to correctly ACK retransmissions, eventually timing
-            # out and then rebooting.  So, inject a delay here.
-            await asyncio.sleep(0.01)
-        except Exception as e:
-            await self.disconnect()
-            raise e
 
-        
     async def set_SERIAL(self, baudrate, flowcontrol, parity):
         await self._gc100.set_SERIAL(self._addr, baudrate, flowcontrol, parity)
+        self._baudrate = baudrate
+        self._set_rate(baudrate)
+
+
+    def _set_rate(self, baudrate):
+        if not baudrate:
+            self._bytes = None
+            return
+        rate = baudrate / BITS_PER_BYTE
+        if self._bytes is None:
+            self._bytes = TokenBucket(rate, burst=self._max_write)
+        else:
+            self._bytes.rate = rate
+
+
+    def _raise_error(self):
+        if self._error is not None:
+            error = self._error
+            self._error = None
+            raise error
+
+
+    async def _write_pending(self):
+        """Write queued data, combining it into as few (paced) writes as possible."""
+        try:
+            while self._pending:
+                await self._packets.acquire()
+                n = min(len(self._pending), self._max_write)
+                if self._bytes is not None:
+                    await self._bytes.acquire(n)
+                data = bytes(self._pending[:n])
+                del self._pending[:n]
+                if len(self._pending) <= self._high_water:
+                    self._below_high_water.set()
+                self._w.write(data)
+                if self._instrument is not None:
+                    self._instrument.serial_bytes(self._gc100.host(), self._addr, sent=n)
+                await self._w.drain()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._error = e
+            await self._close()
+        finally:
+            if self._writer is asyncio.current_task():
+                self._writer = None
+            self._below_high_water.set()
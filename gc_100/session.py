@@ -0,0 +1,376 @@
+"""Persistent (long-lived) connection to the GC-100 command port"""
+
+import asyncio
+import collections
+import itertools
+import re
+import time
+
+from . import messages
+from . import protocol
+
+# The response kinds that can answer each request (where that can be checked).
+REPLIES = {
+    b'getstate': ('state',),
+    b'setstate': ('state',),
+    b'get_IR': ('IR',),
+    b'get_NET': ('NET',),
+    b'get_SERIAL': ('SERIAL',),
+    b'getversion': ('version',),
+    b'getdevices': ('device', 'endlistdevices'),
+}
+
+# The error numbers that only 'sendir' can get, from a GC-100 ('unknowncommand N')
+# and from an iTach ('ERR_<addr>,<nnn>').  Any other error is for another command.
+IR_ERRORS = {5, 6, 7, 8, 9, 10, 15, 16, 21}
+ITACH_IR_ERRORS = {4, 5, 6, 7, 8, 9, 10, 12, 13, 14, 19, 20, 21, 22}
+
+# The most transitions (on and off durations) in one 'sendir' (as gc_100.ircode).
+MAX_TRANSITIONS = 256
+
+# A timing (number) or a compressed on/off pair (letter), in 'sendir' timings.
+_TIMING = re.compile(rb'\d+|[A-O]')
+
+
+class _Pending:
+    """A request that has been sent, and is waiting for its response(s)."""
+
+    __slots__ = ('data', 'ir_key', 'until', 'lines', 'future', 'timing', 'typed')
+
+    def __init__(self, data, ir_key, until, timing=None, typed=False):
+        self.data = data
+        self.ir_key = ir_key
+        self.until = until
+        self.lines = []
+        self.timing = timing
+        self.typed = typed
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class Session:
+    """A single, long-lived connection to the GC-100 command port.
+
+    The session is opened on demand and then kept open between commands.
+    If the link is found to be broken (closed by the GC-100, reset by the
+    network, etc.) it is discarded, and the next request reconnects,
+    backing off between failed attempts.
+
+    Requests are pipelined: several may be in flight at once (up to 'window').
+    As responses arrive (see gc_100.protocol), each is handed to the request
+    that it answers:
+    * The GC-100 answers commands in the order they are sent, so ordinary
+      responses go to the oldest outstanding request.
+    * Errors are matched by error number.  Other errors go to the oldest other
+      request.  IR errors (see IR_ERRORS) go to a 'sendir' that hasn't yet been
+      accepted: one that was sent after the last request to get a response.
+      (An accepted 'sendir' is only waiting for 'completeir'; it can't fail.)
+      If several could have failed, an iTach error goes to the one for its
+      connector address.  A GC-100 error has no address, so it goes to the
+      oldest that could have caused it (judging by its connector and timings;
+      see '_ir_errors()').
+    * Anything else (e.g., 'statechange') is unsolicited, and is passed (as a
+      gc_100.protocol.Response) to the 'on_unsolicited' callback, if any.
+
+    Commands which do not expect a response (see 'send()') are not tracked.
+    If one of them fails, the GC-100's error response will be attributed to
+    the next outstanding request.
+
+    A request that is abandoned (e.g., timed out) still claims its response,
+    when it comes.  If it never does (the GC-100 ignored the request), the
+    abandoned request is dropped once a response arrives that can't be its
+    own (see REPLIES), so later requests still get the right answers.
+
+    If 'timed', requests given a gc_100.instrument.CommandTiming have it
+    filled in, and 'on_connect(seconds, reconnected)' is called after each
+    successful connection.
+    """
+
+    def __init__(self, host, port, retries=5, backoff=0.1, max_backoff=5.0, window=8,
+                 timed=False):
+        self._host = host
+        self._port = port
+        self._timed = timed
+        self._retries = retries
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._conn = None
+        self._open_lock = asyncio.Lock()
+        self._window = asyncio.Semaphore(window)
+        # outstanding requests, in the order they were sent
+        self._pending = collections.deque()
+        # outstanding 'sendir' requests, by (addr, id)
+        self._ir = {}
+        self.on_unsolicited = None
+        self.on_connect = None
+        self.connects = 0
+        # requests in progress (sent, or waiting to be)
+        self.active = 0
+
+    def is_open(self):
+        """Is there a (seemingly) working connection?"""
+        return self._conn is not None and self._conn.is_open()
+
+    async def open(self):
+        """Connect, if not already connected.
+
+        A broken connection is closed and replaced.  Connection attempts are
+        retried (up to 'retries' times) with exponential backoff; the last
+        failure is raised.
+        """
+        async with self._open_lock:
+            if self.is_open():
+                return
+            await self._close()
+
+            delay = self._backoff
+            attempt = 0
+            while True:
+                t_start = time.monotonic()
+                try:
+                    self._conn = await protocol.open_connection(
+                        self._host, self._port, self._dispatch, self._lost, self._timed)
+                    break
+                except OSError:
+                    attempt += 1
+                    if attempt > self._retries:
+                        raise
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self._max_backoff)
+            self.connects += 1
+            if self.on_connect is not None:
+                self.on_connect(time.monotonic() - t_start, self.connects > 1)
+
+    async def wait_closed(self):
+        """Wait until the current connection (if any) is lost or closed."""
+        if self._conn is not None:
+            await self._conn.wait_closed()
+
+    async def close(self):
+        """Close the connection (if any).  The next request will reconnect."""
+        async with self._open_lock:
+            await self._close()
+
+    async def _close(self):
+        conn = self._conn
+        self._conn = None
+        if conn is not None:
+            conn.close()
+            await conn.wait_closed()
+        self._fail(ConnectionResetError("GC-100 command connection closed"))
+
+    async def send(self, data, timing=None):
+        """Send a command (not expecting a response)."""
+        await self.open()
+        if timing is not None:
+            timing.connected = time.monotonic()
+        self._conn.write(data)
+        if timing is not None:
+            timing.written = time.monotonic()
+        await self._conn.drain()
+
+    async def request(self, data, until=None, timing=None, typed=False):
+        """Send a request and return its response.
+
+        The 'data' should be well-formed: 'bytes' terminated with a CR.
+        Normally the response is a single string (without the CR).
+        If 'until' is given, the response is a list of strings, collected
+        up to and including the one whose first token is 'until'
+        (e.g., 'endlistdevices').  Errors are returned, not raised.
+        If 'typed', a single response is returned as a message (see gc_100.messages).
+        """
+        self.active += 1
+        try:
+            async with self._window:
+                await self.open()
+                if timing is not None:
+                    timing.connected = time.monotonic()
+                entry = _Pending(data, self._ir_key(data), until, timing, typed)
+                # Record and write with no intervening 'await', so that the
+                # order of '_pending' is the order on the wire.
+                self._pending.append(entry)
+                if entry.ir_key is not None:
+                    self._ir.setdefault(entry.ir_key, collections.deque()).append(entry)
+                conn = self._conn
+                conn.write(data)
+                if timing is not None:
+                    timing.written = time.monotonic()
+                await conn.drain()
+                return await entry.future
+        finally:
+            self.active -= 1
+
+    def _ir_key(self, data):
+        """Return (addr, id) for a 'sendir' command; otherwise None."""
+        if not data.startswith(b'sendir,'):
+            return None
+        tokens = data.split(b',', 3)
+        return (tokens[1].decode('ascii'), tokens[2].decode('ascii'))
+
+    def _lost(self, exc):
+        # A connection we've already replaced doesn't matter any more.
+        if self._conn is not None and not self._conn.is_open():
+            self._fail(ConnectionResetError("GC-100 closed the command connection"))
+
+    def _dispatch(self, response):
+        kind = response.kind
+        line = response.text
+        if kind == 'completeir':
+            tokens = line.split(',')
+            entries = self._ir.get((tokens[1], tokens[2])) if len(tokens) >= 3 else None
+            if entries:
+                entry = entries.popleft()
+                self._forget_ir(entry)
+                self._remove(entry)
+                self._resolve(entry, response)
+            return
+        if kind == 'statechange':
+            self._unsolicited(response)
+            return
+        if kind == 'unknowncommand' or kind.startswith('ERR'):
+            # an error (GC-100 or iTach)
+            if not self._pending:
+                self._unsolicited(response)
+                return
+            entry = self._error_entry(line)
+            # Any 'sendir' ahead of it was accepted (see below).
+            ahead = itertools.islice(self._pending, self._pending.index(entry))
+            for accepted in [other for other in ahead if other.ir_key is not None]:
+                self._pending.remove(accepted)
+            self._pending.remove(entry)
+            if entry.ir_key is not None:
+                self._forget_ir(entry)
+            self._resolve(entry, response)
+            return
+        # An ordinary response.  Any 'sendir' ahead of it was accepted
+        # (otherwise we would have seen an error); they're now waiting
+        # only for 'completeir'.  Abandoned requests it can't answer were
+        # never answered.
+        while self._pending and (self._pending[0].ir_key is not None
+                                 or self._unanswered(self._pending[0], response)):
+            self._pending.popleft()
+        if not self._pending:
+            self._unsolicited(response)
+            return
+        entry = self._pending[0]
+        if entry.until is None or kind == entry.until:
+            self._pending.popleft()
+            self._resolve(entry, response)
+        else:
+            if entry.timing is not None and entry.timing.first_byte is None:
+                entry.timing.first_byte = response.received
+            entry.lines.append(line)
+
+    def _error_entry(self, line):
+        """Return the outstanding request that error 'line' answers."""
+        addr = None
+        try:
+            if line.startswith('ERR'):
+                addr, _, errno = line[4:].rpartition(',')
+                errno = int(errno)
+                ir = errno in ITACH_IR_ERRORS
+            else:
+                errno = int(line.split(' ')[1])
+                ir = errno in IR_ERRORS
+        except (IndexError, ValueError):
+            return self._pending[0]
+        if not ir:
+            for entry in self._pending:
+                if entry.ir_key is None:
+                    return entry
+            # @todo 'sendir' can get some general errors too (e.g., 4)
+            return self._pending[0]
+        waiting = [entry for entry in self._pending if entry.ir_key is not None]
+        if not waiting:
+            return self._pending[0]
+        for entry in waiting:
+            if addr:
+                if entry.ir_key[0] == addr:
+                    return entry
+            elif errno in self._ir_errors(entry.data):
+                return entry
+        # nothing more likely than the oldest
+        return waiting[0]
+
+    def _ir_errors(self, data):
+        """Return the GC-100 error numbers that 'sendir' command 'data' could get."""
+        errors = {21}
+        tokens = data.rstrip(b'\r').split(b',', 6)
+        try:
+            connector = int(tokens[1].split(b':')[1])
+            offset = int(tokens[5])
+            transitions = sum(1 if token.isdigit() else 2
+                              for token in _TIMING.findall(tokens[6]))
+        except (IndexError, ValueError):
+            return set(IR_ERRORS)
+        if 1 <= connector <= 3:
+            # connector is a sensor input
+            errors.add(4 + connector)
+        if offset % 2 == 0:
+            errors.add(8)
+        if transitions > MAX_TRANSITIONS:
+            errors.update((9, 15))
+        if transitions % 2:
+            errors.update((10, 16))
+        return errors
+
+    def _unanswered(self, entry, response):
+        """Was 'entry' abandoned, and is 'response' not its answer?"""
+        if not entry.future.done() or entry.lines:
+            return False
+        tokens = entry.data.rstrip(b'\r').split(b',', 2)
+        kinds = REPLIES.get(tokens[0])
+        if kinds is None:
+            # can't tell
+            return False
+        if response.kind not in kinds:
+            return True
+        if len(tokens) > 1 and entry.until is None:
+            return response.text.split(',', 2)[1:2] != [tokens[1].decode('ascii')]
+        return False
+
+    def _forget_ir(self, entry):
+        entries = self._ir.get(entry.ir_key)
+        if entries is None:
+            return
+        try:
+            entries.remove(entry)
+        except ValueError:
+            pass
+        if not entries:
+            del self._ir[entry.ir_key]
+
+    def _remove(self, entry):
+        try:
+            self._pending.remove(entry)
+        except ValueError:
+            pass
+
+    def _resolve(self, entry, response):
+        # The requester may have given up (e.g., been cancelled); that's fine.
+        if entry.future.done():
+            return
+        timing = entry.timing
+        if timing is not None:
+            if timing.first_byte is None:
+                timing.first_byte = response.received
+            timing.responded = time.monotonic()
+        line = response.text
+        if entry.until is None:
+            entry.future.set_result(messages.from_response(response) if entry.typed else line)
+        else:
+            entry.lines.append(line)
+            entry.future.set_result(entry.lines)
+
+    def _fail(self, exc):
+        entries = list(self._pending)
+        for waiting in self._ir.values():
+            entries.extend(waiting)
+        self._pending = collections.deque()
+        self._ir = {}
+        for entry in entries:
+            if not entry.future.done():
+                entry.future.set_exception(exc)
+
+    def _unsolicited(self, response):
+        if self.on_unsolicited is not None:
+            self.on_unsolicited(response)
@@ -0,0 +1,442 @@
+"""Simulated GC-100, for testing (and load testing) without the hardware.
+
+The simulator speaks the GC-100 command protocol (as used by this library) on the
+command port, and passes serial data through on the serial ports (4999 and up).
+Run it in-process:
+
+    sim = Simulator(host='127.0.0.2')
+    await sim.start()
+    gc = gc_100.GC100('127.0.0.2')
+    ...
+    await sim.stop()
+
+or from the command line:
+
+    $ python -m gc_100.simulator --host 127.0.0.2 --layout SERIAL,IR,IR,RELAY
+
+Since the serial port numbers are fixed (see gc_100.serial), run each simulated
+unit on its own loopback address (127.0.0.x) if you need more than one.
+"""
+
+import argparse
+import asyncio
+
+from .core import CR, DEFAULT_PORT, SEP
+from .serial import BASE_PORT
+
+# The GC-100-12: two serial modules, two IR modules, and a relay module.
+DEFAULT_LAYOUT = ('SERIAL', 'SERIAL', 'IR', 'IR', 'RELAY')
+
+# Ports (connectors) per module, by module type.
+PORTS = {'SERIAL': 1, 'IR': 3, 'RELAY': 3}
+
+IR_MODES = ('IR', 'SENSOR', 'SENSOR_NOTIFY', 'IR_NOCARRIER')
+
+MAX_TRANSITIONS = 256
+
+
+class _Reject(Exception):
+    """Reject a command with GC-100 error number 'errno'."""
+
+    def __init__(self, errno):
+        self.errno = errno
+
+
+class _Connector:
+    """State of a single connector (module:port)."""
+
+    def __init__(self, addr, type):
+        self.addr = addr
+        self.type = type
+        self.mode = 'IR' if type == 'IR' else None
+        self.state = 0
+        self.serial = {'baud': 9600, 'flow': 'FLOW_NONE', 'parity': 'PARITY_NO'}
+        # IR transmission in progress (set to stop it), and the IR waiting to be sent
+        self.ir = None
+        self.ir_queue = None
+
+
+class Simulator:
+    """A simulated GC-100.
+
+    'layout' lists the module types (e.g., 'IR', 'SERIAL', 'RELAY') in module order,
+    starting at module 1.  'modes' may set the initial mode of IR connectors, by
+    address (e.g., {'3:1': 'SENSOR_NOTIFY'}).
+
+    To reproduce performance problems:
+    * 'latency' delays every response (seconds); or, given a mapping of command
+      name to seconds (e.g., {'getstate': 0.2}), just the responses to those commands.
+    * 'ir_time' fixes the duration of every IR transmission (seconds); by default
+      it's computed from the IR code (frequency, timing and repeat count).
+    * 'fragment' splits every response into pieces of (at most) that many bytes.
+    * 'max_connections' limits concurrent command port connections; extras are
+      closed immediately.
+
+    Serial data received on a serial port is passed to 'on_serial(index, data)';
+    by default it's echoed back.  Use 'serial_send()' to send serial data to the
+    client.  With 'serial_pacing', serial data moves no faster than the configured
+    baud rate.
+    """
+
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT, layout=DEFAULT_LAYOUT, modes=None,
+                 latency=0.0, ir_time=None, fragment=0, max_connections=None,
+                 serial_base=BASE_PORT, serial_pacing=False):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.ir_time = ir_time
+        self.fragment = fragment
+        self.max_connections = max_connections
+        self.serial_pacing = serial_pacing
+        self.on_serial = None
+        self._serial_base = serial_base
+        self._modules = []
+        self._connectors = {}
+        self._serial_index = {}
+        for module, type in enumerate(layout, start=1):
+            type = type.split()[-1].upper()
+            self._modules.append(type)
+            for port in range(1, PORTS.get(type, 0) + 1):
+                addr = f"{module}:{port}"
+                self._connectors[addr] = _Connector(addr, type)
+                if type == 'SERIAL':
+                    self._serial_index[len(self._serial_index)] = addr
+        for addr, mode in (modes or {}).items():
+            self._connectors[addr].mode = mode
+        self._server = None
+        self._serial_servers = []
+        self._clients = set()
+        self._serial_clients = {}
+        self._tasks = set()
+        self._handlers = set()
+        # statistics
+        self.connections = 0
+        self.rejected = 0
+        self.commands = 0
+        self.serial_in = 0
+        self.serial_out = 0
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._command_client, self.host, self.port)
+        if self.port == 0:
+            self.port = self._server.sockets[0].getsockname()[1]
+        for index in self._serial_index:
+            server = await asyncio.start_server(
+                lambda r, w, index=index: self._serial_client(index, r, w),
+                self.host, self._serial_base + index)
+            self._serial_servers.append(server)
+
+    async def stop(self):
+        servers = [self._server] + self._serial_servers
+        self._server = None
+        self._serial_servers = []
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = set()
+        for w in list(self._clients) + list(self._serial_clients.values()):
+            w.close()
+        # let the client handlers see their connections close.
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        for server in servers:
+            if server is not None:
+                server.close()
+                await server.wait_closed()
+
+    # Digital inputs.
+
+    def set_input(self, addr, state):
+        """Change the state of a digital input (or relay).
+
+        If the input is configured for SENSOR_NOTIFY, a 'statechange' is sent to
+        every command port client.
+        """
+        connector = self._connectors[addr]
+        state = 1 if state else 0
+        if connector.state == state:
+            return
+        connector.state = state
+        if connector.mode == 'SENSOR_NOTIFY':
+            data = bytes(f"statechange,{addr},{state}", encoding='ascii')+CR
+            for w in list(self._clients):
+                w.write(data)
+
+    def get_input(self, addr):
+        return self._connectors[addr].state
+
+    # Serial data.
+
+    def serial_send(self, index, data):
+        """Send serial 'data' (bytes) to the client on serial port 'index' (if any)."""
+        w = self._serial_clients.get(index)
+        if w is not None:
+            self.serial_out += len(data)
+            w.write(data)
+
+    async def _serial_client(self, index, r, w):
+        if index in self._serial_clients:
+            # only one connection per serial port.
+            self.rejected += 1
+            w.close()
+            return
+        self._serial_clients[index] = w
+        self._handlers.add(asyncio.current_task())
+        connector = self._connectors[self._serial_index[index]]
+        try:
+            while True:
+                data = await r.read(4096)
+                if not data:
+                    break
+                self.serial_in += len(data)
+                if self.serial_pacing:
+                    # 10 bits per byte: start, 8 data, stop.
+                    await asyncio.sleep(len(data) * 10 / connector.serial['baud'])
+                if self.on_serial is not None:
+                    self.on_serial(index, data)
+                else:
+                    self.serial_send(index, data)
+                await w.drain()
+        except ConnectionError:
+            pass
+        finally:
+            del self._serial_clients[index]
+            self._handlers.discard(asyncio.current_task())
+            w.close()
+
+    # Command port.
+
+    async def _command_client(self, r, w):
+        if self.max_connections is not None and len(self._clients) >= self.max_connections:
+            self.rejected += 1
+            w.close()
+            return
+        self.connections += 1
+        self._clients.add(w)
+        self._handlers.add(asyncio.current_task())
+        try:
+            while True:
+                try:
+                    line = await r.readuntil(CR)
+                except asyncio.IncompleteReadError:
+                    break
+                self.commands += 1
+                command = line[:-1].decode('ascii').strip()
+                try:
+                    response = self._execute(command, w)
+                except _Reject as e:
+                    response = f"unknowncommand {e.errno}"
+                if response is None:
+                    continue
+                delay = self._latency(command)
+                if delay:
+                    await asyncio.sleep(delay)
+                await self._send(w, response)
+        except ConnectionError:
+            pass
+        finally:
+            self._clients.discard(w)
+            self._handlers.discard(asyncio.current_task())
+            w.close()
+
+    def _latency(self, command):
+        """Return the response delay for 'command', in seconds."""
+        if isinstance(self.latency, (int, float)):
+            return self.latency
+        return self.latency.get(command.split(',', 1)[0], 0.0)
+
+    async def _send(self, w, response):
+        data = bytes(response, encoding='ascii')+CR
+        if not self.fragment:
+            w.write(data)
+        else:
+            for i in range(0, len(data), self.fragment):
+                w.write(data[i:i+self.fragment])
+                await w.drain()
+                await asyncio.sleep(0)
+        await w.drain()
+
+    def _connector(self, addr, type=None):
+        """Look up connector 'addr', which must be on a module of 'type' (if given)."""
+        try:
+            module, port = (int(n) for n in addr.split(':'))
+        except ValueError:
+            raise _Reject(4)
+        if module < 1 or module > len(self._modules):
+            raise _Reject(3)
+        connector = self._connectors.get(addr)
+        if connector is None:
+            raise _Reject(4)
+        if type is not None and connector.type != type:
+            raise _Reject({'IR': 21, 'RELAY': 11}.get(type, 23))
+        return connector
+
+    def _execute(self, command, w):
+        """Execute 'command'; return the response (None if there isn't one)."""
+        tokens = command.split(SEP)
+        name = tokens[0]
+        args = tokens[1:]
+        handler = getattr(self, f"_cmd_{name}", None)
+        if handler is None:
+            raise _Reject(14)
+        try:
+            return handler(w, *args)
+        except TypeError:
+            # wrong number of arguments
+            raise _Reject(14)
+
+    def _cmd_blink(self, w, on):
+        return None
+
+    def _cmd_getdevices(self, w):
+        devices = [f"device,{module},{PORTS.get(type, 0)} {type}"
+                   for module, type in enumerate(self._modules, start=1)]
+        return '\r'.join(devices + ['endlistdevices'])
+
+    def _cmd_getversion(self, w, module):
+        if not module.isdigit() or not 0 <= int(module) <= len(self._modules):
+            raise _Reject(2)
+        return f"version,{module},3.2-12"
+
+    def _cmd_get_NET(self, w, addr):
+        return f"NET,0:1,UNLOCKED,STATIC,{self.host},255.255.255.0,{self.host}"
+
+    def _cmd_get_IR(self, w, addr):
+        connector = self._connector(addr, 'IR')
+        return f"IR,{addr},{connector.mode}"
+
+    def _cmd_set_IR(self, w, addr, mode):
+        connector = self._connector(addr, 'IR')
+        if mode not in IR_MODES:
+            raise _Reject(14)
+        connector.mode = mode
+        return None
+
+    def _cmd_get_SERIAL(self, w, addr):
+        s = self._connector(addr, 'SERIAL').serial
+        return f"SERIAL,{addr},{s['baud']},{s['flow']},{s['parity']}"
+
+    def _cmd_set_SERIAL(self, w, addr, baud, flow, parity):
+        connector = self._connector(addr, 'SERIAL')
+        connector.serial = {'baud': int(baud), 'flow': flow, 'parity': parity}
+        return None
+
+    def _cmd_getstate(self, w, addr):
+        connector = self._connector(addr)
+        if connector.type == 'IR' and not connector.mode.startswith('SENSOR'):
+            raise _Reject(13)
+        if connector.type not in ('IR', 'RELAY'):
+            raise _Reject(13)
+        return f"state,{addr},{connector.state}"
+
+    def _cmd_setstate(self, w, addr, state):
+        connector = self._connector(addr, 'RELAY')
+        connector.state = 1 if state == '1' else 0
+        return f"state,{addr},{connector.state}"
+
+    def _cmd_sendir(self, w, addr, id, freq, count, offset, *timing):
+        connector = self._connector(addr, 'IR')
+        if connector.mode.startswith('SENSOR'):
+            raise _Reject(4 + int(addr.split(':')[1]))
+        try:
+            freq = int(freq)
+            count = int(count)
+            offset = int(offset)
+            timing = [int(t) for t in timing]
+        except ValueError:
+            raise _Reject(14)
+        if offset % 2 == 0:
+            raise _Reject(8)
+        if len(timing) > MAX_TRANSITIONS:
+            raise _Reject(9)
+        if len(timing) % 2:
+            raise _Reject(10)
+        if self.ir_time is not None:
+            duration = self.ir_time
+        else:
+            periods = sum(timing) + (count - 1) * sum(timing[offset-1:])
+            duration = periods / freq
+        if connector.ir_queue is None:
+            connector.ir_queue = asyncio.Queue()
+            self._tasks.add(asyncio.create_task(self._transmit(connector)))
+        connector.ir_queue.put_nowait((w, id, duration))
+        return None
+
+    def _cmd_stopir(self, w, addr):
+        connector = self._connector(addr, 'IR')
+        if connector.ir is not None:
+            connector.ir.set()
+        return None
+
+    async def _transmit(self, connector):
+        """Send queued IR commands for 'connector', one at a time."""
+        while True:
+            w, id, duration = await connector.ir_queue.get()
+            connector.ir = asyncio.Event()
+            try:
+                await asyncio.wait_for(connector.ir.wait(), duration)
+            except asyncio.TimeoutError:
+                pass
+            connector.ir = None
+            if not w.is_closing():
+                await self._send(w, f"completeir,{connector.addr},{id}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated Global Cache GC-100")
+    parser.add_argument('--host', default='127.0.0.1',
+                        help="address to listen on (default = 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help=f"command port (default = {DEFAULT_PORT})")
+    parser.add_argument('--layout', default=','.join(DEFAULT_LAYOUT),
+                        help="module types, in order (default = %(default)s)")
+    parser.add_argument('--mode', action='append', default=[], metavar='ADDR=MODE',
+                        help="initial IR connector mode (e.g., 3:1=SENSOR_NOTIFY)")
+    parser.add_argument('--latency', action='append', default=[],
+                        metavar='SECONDS|COMMAND=SECONDS',
+                        help="response delay, in seconds; or, for one command (may be repeated)")
+    parser.add_argument('--ir-time', type=float, default=None,
+                        help="fixed IR transmit time, in seconds (default: computed)")
+    parser.add_argument('--fragment', type=int, default=0,
+                        help="split responses into pieces of this many bytes")
+    parser.add_argument('--max-connections', type=int, default=None,
+                        help="limit concurrent command port connections")
+    parser.add_argument('--serial-pacing', action='store_true',
+                        help="pass serial data no faster than the baud rate")
+    args = parser.parse_args()
+
+    modes = dict(m.split('=', 1) for m in args.mode)
+    latency = 0.0
+    try:
+        if len(args.latency) == 1 and '=' not in args.latency[0]:
+            latency = float(args.latency[0])
+        elif args.latency:
+            latency = {name: float(seconds)
+                       for name, seconds in (item.split('=', 1) for item in args.latency)}
+    except ValueError:
+        parser.error(f"invalid --latency: {' '.join(args.latency)}")
+    sim = Simulator(args.host, args.port, args.layout.split(','), modes,
+                    latency=latency, ir_time=args.ir_time, fragment=args.fragment,
+                    max_connections=args.max_connections, serial_pacing=args.serial_pacing)
+
+    async def run():
+        await sim.start()
+        print(f"GC-100 simulator listening on {sim.host}:{sim.port}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await sim.stop()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
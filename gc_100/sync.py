@@ -0,0 +1,229 @@
+"""Synchronous (blocking) interface, for code that doesn't use asyncio.
+
+The classes here mirror GC100, Relay, IR_out, Digital_In, and Serial; their
+methods take the same arguments, but block until done (rather than being
+awaited):
+
+    from gc_100 import sync
+
+    gc = sync.GC100('192.168.1.99')
+    relay = sync.Relay(gc, '3:1')
+    relay.setstate(True)
+
+All of the work is done on one long-lived event loop, running on a background
+thread (shared by default), so connections are reused from call to call.  They
+may be used from any number of threads at once.  To run several commands
+together, 'submit()' them; each returns a concurrent.futures.Future:
+
+    futures = [gc.submit('setstate', addr, True) for addr in ('3:1', '3:2', '3:3')]
+    concurrent.futures.wait(futures)
+
+Asynchronous iterators (e.g., from 'Digital_In.subscribe()' and 'Serial.frames()')
+become ordinary (blocking) iterators, and asynchronous context managers (e.g.,
+'IR_out.hold()') become ordinary ones.  Listener callbacks ('add_listener()') are
+called on the event loop's thread.
+"""
+
+import asyncio
+import functools
+import inspect
+import threading
+
+from . import core
+from . import read_ir
+from . import relay
+from . import send_ir
+from . import serial
+
+# Ordinary methods that use the event loop (e.g., to start a task), so are
+# called on its thread.
+LOOP_METHODS = {'add_listener', 'remove_listener', 'add_reconnect_listener',
+                'remove_reconnect_listener', 'next_id'}
+
+
+class EventLoopThread:
+    """An asyncio event loop, running forever on its own (daemon) thread."""
+
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever,
+                                        name='gc_100.sync', daemon=True)
+        self._thread.start()
+
+    def submit(self, coro):
+        """Start running 'coro' on the loop; return a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def run(self, coro, timeout=None):
+        """Run 'coro' on the loop, and wait for (and return) its result."""
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def call(self, function, *args, **kwargs):
+        """Call (ordinary) 'function' on the loop's thread; return its result."""
+        async def call():
+            return function(*args, **kwargs)
+        return self.run(call())
+
+    def stop(self):
+        if self._thread is threading.current_thread():
+            raise RuntimeError("can't stop the event loop from its own thread")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+_default_loop = None
+_default_lock = threading.Lock()
+
+
+def default_loop():
+    """Return the shared EventLoopThread (starting it, the first time)."""
+    global _default_loop
+    with _default_lock:
+        if _default_loop is None:
+            _default_loop = EventLoopThread()
+        return _default_loop
+
+
+class _Iterator:
+    """A blocking iterator over an asynchronous iterator (run on 'loop')."""
+
+    def __init__(self, aiter, loop, wait=None):
+        self._aiter = aiter
+        self._loop = loop
+        self._wait = wait
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return self._loop.run(self._aiter.__anext__(), self._wait)
+        except StopAsyncIteration:
+            raise StopIteration from None
+
+    def __getattr__(self, name):
+        # e.g., 'dropped'
+        return getattr(self._aiter, name)
+
+    def close(self):
+        if hasattr(self._aiter, 'aclose'):
+            self._loop.run(self._aiter.aclose())
+        elif hasattr(self._aiter, 'close'):
+            self._loop.call(self._aiter.close)
+
+
+class _ContextManager:
+    """A blocking context manager over an asynchronous one (run on 'loop').
+
+    Its value (if any) is proxied, too.
+    """
+
+    def __init__(self, manager, loop, wait=None):
+        self._manager = manager
+        self._loop = loop
+        self._wait = wait
+
+    def __enter__(self):
+        value = self._loop.run(self._manager.__aenter__(), self._wait)
+        return None if value is None else _Proxy(value, self._loop, self._wait)
+
+    def __exit__(self, *exc):
+        return self._loop.run(self._manager.__aexit__(*exc), self._wait)
+
+
+class _Proxy:
+    """Blocking access to the methods of (asynchronous) object 'obj'.
+
+    Coroutine methods are run on 'loop', waiting at most 'wait' seconds
+    (None means forever).  Ordinary methods are called directly, except
+    those that use the loop (see LOOP_METHODS), which are called on its thread.
+    """
+
+    def __init__(self, obj, loop, wait=None):
+        self._obj = obj
+        self._loop = loop
+        self._wait = wait
+
+    def __getattr__(self, name):
+        attr = getattr(self._obj, name)
+        if inspect.iscoroutinefunction(attr):
+            @functools.wraps(attr)
+            def method(*args, **kwargs):
+                return self._loop.run(attr(*args, **kwargs), self._wait)
+        elif inspect.isasyncgenfunction(attr):
+            @functools.wraps(attr)
+            def method(*args, **kwargs):
+                return _Iterator(attr(*args, **kwargs), self._loop, self._wait)
+        elif inspect.isasyncgenfunction(getattr(attr, '__wrapped__', None)):
+            # an asynchronous context manager (e.g., 'IR_out.hold()')
+            @functools.wraps(attr)
+            def method(*args, **kwargs):
+                return _ContextManager(attr(*args, **kwargs), self._loop, self._wait)
+        elif name == 'subscribe':
+            # creates an asynchronous iterator; do it on the loop.
+            @functools.wraps(attr)
+            def method(*args, **kwargs):
+                return _Iterator(self._loop.call(attr, *args, **kwargs), self._loop, self._wait)
+        elif name in LOOP_METHODS:
+            @functools.wraps(attr)
+            def method(*args, **kwargs):
+                return self._loop.call(attr, *args, **kwargs)
+        else:
+            return attr
+        # remember it, so the next lookup is direct.
+        setattr(self, name, method)
+        return method
+
+    def submit(self, name, *args, **kwargs):
+        """Start coroutine method 'name'; return a concurrent.futures.Future of its result."""
+        return self._loop.submit(getattr(self._obj, name)(*args, **kwargs))
+
+
+class GC100(_Proxy):
+    """A GC-100 (see gc_100.GC100).
+
+    Unlike gc_100.GC100, this defaults to a persistent connection.  Other
+    keyword arguments (e.g., 'timeout', 'retries', 'connections') are passed on
+    to gc_100.GC100.  Each method blocks for at most 'wait' seconds (None means
+    forever), after which it gives up waiting (raising TimeoutError) and
+    cancels the command; prefer 'timeout', which applies within the command.
+    """
+
+    def __init__(self, host, port=core.DEFAULT_PORT, persistent=True, loop=None, wait=None,
+                 **kwargs):
+        loop = loop or default_loop()
+        gc100 = loop.call(core.GC100, host, port, persistent=persistent, **kwargs)
+        super().__init__(gc100, loop, wait)
+
+
+class Relay(_Proxy):
+    def __init__(self, gc100, addr):
+        super().__init__(relay.Relay(gc100._obj, addr), gc100._loop, gc100._wait)
+
+
+class IR_out(_Proxy):
+    def __init__(self, gc100, addr):
+        super().__init__(send_ir.IR_out(gc100._obj, addr), gc100._loop, gc100._wait)
+
+
+class Digital_In(_Proxy):
+    def __init__(self, gc100, addr):
+        super().__init__(read_ir.Digital_In(gc100._obj, addr), gc100._loop, gc100._wait)
+
+
+class Serial(_Proxy):
+    """A serial port (see gc_100.Serial).
+
+    Note that 'recv()' (and iterating over 'frames()') blocks for at most 'wait'
+    seconds (see GC100), as for any other method.
+    """
+
+    def __init__(self, gc100, addr, index, **kwargs):
+        port = gc100._loop.call(serial.Serial, gc100._obj, addr, index, **kwargs)
+        super().__init__(port, gc100._loop, gc100._wait)
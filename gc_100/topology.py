@@ -0,0 +1,52 @@
+"""Cache of GC-100 configuration (topology)"""
+
+import time
+
+
+class Topology:
+    """Cached configuration responses, by key, each valid for 'ttl' seconds.
+
+    A 'ttl' of None means entries never expire (they can still be invalidated).
+    The keys used by GC100 are:
+    * 'devices': the module list (from 'getdevices')
+    * ('IR', addr): IR connector mode (from 'get_IR')
+    * ('SERIAL', addr): serial port settings (from 'get_SERIAL')
+    * ('version', module): firmware version (from 'getversion')
+    """
+
+    def __init__(self, ttl=None):
+        self._ttl = ttl
+        self._entries = {}
+
+    def get(self, key):
+        """Return the cached value for 'key', or None if missing (or expired)."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and time.monotonic() >= expires:
+            del self._entries[key]
+            return None
+        return value
+
+    def put(self, key, value):
+        expires = None if self._ttl is None else time.monotonic() + self._ttl
+        self._entries[key] = (value, expires)
+
+    def invalidate(self, key=None):
+        """Forget 'key' (or everything, if None)."""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def module_type(self, module):
+        """Return the (cached) type of 'module' (e.g., 'IR'), or None if unknown."""
+        devices = self.get('devices')
+        if devices is None:
+            return None
+        prefix = f"device,{module},"
+        for device in devices:
+            if device.startswith(prefix):
+                return device.rsplit(' ', 1)[-1]
+        return None
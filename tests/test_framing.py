@@ -0,0 +1,94 @@
+"""Tests of serial data framing (gc_100.framing, and gc_100.serial 'frames()')"""
+
+import asyncio
+
+import gc_100
+from gc_100 import framing
+from gc_100.framing import FrameBuffer
+from gc_100.simulator import Simulator
+
+# No test should take nearly this long (seconds).
+TIMEOUT = 10
+
+
+def split(buffer, framer, *chunks):
+    frames = []
+    for chunk in chunks:
+        buffer.feed(chunk)
+        frames.extend(bytes(frame) for frame in buffer.frames(framer))
+    return frames
+
+
+def test_delimiter():
+    buffer = FrameBuffer()
+    assert split(buffer, framing.Delimiter(b'\r\n'), b'one\r', b'\ntwo\r\nthr', b'ee\r\n') == [
+        b'one', b'two', b'three']
+    assert len(buffer) == 0
+    assert split(buffer, framing.Delimiter(include=True), b'a\rb\r') == [b'a\r', b'b\r']
+
+
+def test_fixed_length():
+    buffer = FrameBuffer()
+    assert split(buffer, framing.FixedLength(3), b'abcd', b'efg', b'h') == [b'abc', b'def']
+    assert buffer.flush() == b'gh'
+    assert len(buffer) == 0
+
+
+def test_length_prefix():
+    buffer = FrameBuffer()
+    data = b'\x00\x03abc\x00\x01d'
+    assert split(buffer, framing.LengthPrefix(size=2), data[:3], data[3:]) == [b'abc', b'd']
+    # a length that doesn't count a 1-byte checksum
+    framer = framing.LengthPrefix(include_header=True, adjust=1)
+    assert split(buffer, framer, b'\x02ab!\x00') == [b'\x02ab!']
+    assert split(buffer, framer, b'?') == [b'\x00?']
+
+
+def test_pattern():
+    buffer = FrameBuffer()
+    framer = framing.Pattern(rb'[.!?]')
+    assert split(buffer, framer, b'Hello! How are', b' you? Fine.') == [
+        b'Hello!', b' How are you?', b' Fine.']
+
+
+def test_buffer_reuse():
+    buffer = FrameBuffer(max_size=64)
+    size = len(buffer._buffer)
+    framer = framing.Delimiter()
+    for i in range(2000):
+        assert split(buffer, framer, b'frame %d\r' % i, b'part') == [b'frame %d' % i]
+        buffer.flush()
+    assert len(buffer._buffer) == size
+    # a partial frame longer than a read still fits (up to 'max_size')
+    buffer = FrameBuffer()
+    assert split(buffer, framer, b'x' * 10000, b'\r') == [b'x' * 10000]
+
+
+def test_overflow():
+    buffer = FrameBuffer(max_size=16)
+    framer = framing.Delimiter()
+    assert split(buffer, framer, b'a' * 20, b'b\r') == [b'b']
+    assert buffer.overflows == 1
+    assert split(buffer, framer, b'c\r') == [b'c']
+
+
+def test_serial_frames():
+    async def test():
+        # a serial port (4999) on its own address
+        async with Simulator(host='127.0.0.6', port=0, layout=('SERIAL', 'RELAY')) as sim:
+            gc = gc_100.GC100(sim.host, sim.port)
+            port = gc_100.Serial(gc, '1:1', 0)
+            await port.connect()
+            try:
+                await asyncio.sleep(0.1)
+                sim.serial_send(0, b'one\r\ntw')
+                sim.serial_send(0, b'o\r\nthree')
+                frames = []
+                async for frame in port.frames(framing.Pattern(rb'\r\n', timeout=0.2)):
+                    frames.append(frame)
+                    if len(frames) == 3:
+                        break
+                assert frames == [b'one\r\n', b'two\r\n', b'three']
+            finally:
+                await port.disconnect()
+    asyncio.run(asyncio.wait_for(test(), TIMEOUT))
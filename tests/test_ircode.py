@@ -0,0 +1,57 @@
+"""Tests of IR code formats (gc_100.ircode)"""
+
+import pytest
+
+from gc_100 import core, ircode
+
+# once-only burst: 2 pairs; repeated burst: 2 pairs
+PRONTO = '0000 006D 0002 0002 0157 00AC 0015 0016 0015 0040 0015 05ED'
+TIMINGS = [343, 172, 21, 22, 21, 64, 21, 1517]
+
+
+def test_check():
+    ircode.check(TIMINGS, 5)
+    for timings, offset, errno in ((TIMINGS, 2, 8), ([21] * 258, 1, 9), (TIMINGS[:-1], 1, 10)):
+        with pytest.raises(core.CommandError) as e:
+            ircode.check(timings, offset)
+        assert e.value.errno == errno
+    with pytest.raises(ValueError):
+        ircode.check(TIMINGS, 9)
+
+
+def test_compress():
+    timings = [342, 171, 21, 21, 21, 64, 21, 21, 21, 21, 21, 64, 21, 1500]
+    code = ircode.compress(timings)
+    assert code == '342,171,21,21,21,64BBC,21,1500'
+    assert ircode.parse_timings(code) == timings
+    assert ircode.parse_timings(ircode.timing_string(timings)) == timings
+    # only the first 15 distinct pairs get letters
+    timings = [n for i in range(20) for n in (10, 100 + i)] * 2
+    assert ircode.parse_timings(ircode.compress(timings)) == timings
+
+
+def test_invalid_timings():
+    for code in ('1,2,x', '1,2,3A', '1,2,B', '-1,2'):
+        with pytest.raises(ValueError):
+            ircode.parse_timings(code)
+    with pytest.raises(core.CommandError):
+        ircode.compress([1, 2, 3])
+
+
+def test_pronto():
+    freq, timings, offset = ircode.from_pronto(PRONTO)
+    assert (freq, timings, offset) == (38029, TIMINGS, 5)
+    assert ircode.to_pronto(freq, timings, offset) == PRONTO
+    # with offset 1, all of it is repeated
+    assert ircode.to_pronto(freq, ircode.timing_string(timings)).startswith('0000 006D 0000 0004')
+    for code in ('0100 006D 0000 0001 0001 0001', '0000 0000 0000 0001 0001 0001',
+                 '0000 006D 0000 0002 0001 0001', '0000 006D', '0000 006D 0'):
+        with pytest.raises(ValueError):
+            ircode.from_pronto(code)
+
+
+def test_pronto_all():
+    codes = [PRONTO, '0000 0068 0000 0001 0010 0020', PRONTO.replace('0157', '0158')]
+    assert ircode.from_pronto_all(codes) == [ircode.from_pronto(code) for code in codes]
+    with pytest.raises(ValueError):
+        ircode.from_pronto_all([PRONTO, '0000 006D 0000 0002 0001 0001'])
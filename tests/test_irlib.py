@@ -0,0 +1,71 @@
+"""Tests of the IR code library (gc_100.irlib)"""
+
+import pytest
+
+from gc_100 import core
+from gc_100.irlib import IRLibrary
+
+POWER = '0000 006D 0000 0002 0157 00AC 0015 05ED'
+TIMINGS = [343, 172, 21, 1517]
+
+
+def library():
+    library = IRLibrary(cache_size=2)
+    library.add_pronto('Sony', 'TV', 'power', POWER)
+    # the same timings: stored once
+    library.add_pronto('Sony', 'Projector', 'power', POWER)
+    library.add('Sony', 'TV', 'mute', 40000, '100,50,10,20BA', offset=3)
+    return library
+
+
+def test_add():
+    lib = library()
+    assert len(lib) == 3 and lib.sequences() == 2
+    assert lib.brands() == ['Sony']
+    assert lib.devices('Sony') == ['TV', 'Projector']
+    assert lib.functions('Sony', 'TV') == ['power', 'mute']
+    assert lib.get('Sony', 'TV', 'power') == (38029, TIMINGS, 1)
+    assert lib.get('Sony', 'TV', 'mute') == (40000, [100, 50, 10, 20, 10, 20, 100, 50], 3)
+    with pytest.raises(KeyError):
+        lib.get('Sony', 'TV', 'input')
+    with pytest.raises(core.CommandError):
+        lib.add('Sony', 'TV', 'input', 40000, [1, 2, 3])
+
+
+def test_replace():
+    lib = library()
+    command = lib.command('2:1', 'Sony', 'TV', 'power')
+    lib.add('Sony', 'TV', 'power', 36000, TIMINGS)
+    assert len(lib) == 3
+    assert lib.command('2:1', 'Sony', 'TV', 'power') != command
+
+
+def test_command():
+    lib = library()
+    command = lib.command('2:1', 'Sony', 'TV', 'power', count=2, id=7)
+    assert command == b'sendir,2:1,7,38029,2,1,343,172,21,1517\r'
+    assert lib.command('2:1', 'Sony', 'TV', 'power', count=2, id=7) is command
+    lib.command('2:2', 'Sony', 'TV', 'power', count=2, id=7)
+    lib.command('2:3', 'Sony', 'TV', 'power', count=2, id=7)
+    # only the most recent 2 are kept
+    assert lib.command('2:1', 'Sony', 'TV', 'power', count=2, id=7) is not command
+
+
+def test_save(tmp_path):
+    path = tmp_path / 'codes.gcir'
+    saved = library()
+    saved.save(path)
+    lib = IRLibrary.open(path)
+    try:
+        assert len(lib) == 3 and lib.sequences() == 2
+        for device, function in (('TV', 'power'), ('Projector', 'power'), ('TV', 'mute')):
+            assert lib.get('Sony', device, function) == saved.get('Sony', device, function)
+        assert lib.command('2:1', 'Sony', 'TV', 'mute') == saved.command('2:1', 'Sony', 'TV', 'mute')
+        with pytest.raises(ValueError):
+            lib.add_pronto('Sony', 'TV', 'input', POWER)
+    finally:
+        lib.close()
+    assert len(lib) == 0
+    path.write_bytes(b'GCIR' + bytes(100))
+    with pytest.raises(ValueError):
+        IRLibrary.open(path)
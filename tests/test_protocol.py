@@ -0,0 +1,52 @@
+"""Tests of the command port response parser (gc_100.protocol)"""
+
+from gc_100 import protocol
+
+
+def texts(parser):
+    return [response.text for response in parser.responses()]
+
+
+def test_fragments():
+    parser = protocol.ResponseParser()
+    parser.feed(b'sta')
+    assert texts(parser) == []
+    assert parser.pending()
+    parser.feed(b'te,3:1,1\rdevice,1,3 IR\rend')
+    assert texts(parser) == ['state,3:1,1', 'device,1,3 IR']
+    parser.feed(b'listdevices\r')
+    assert texts(parser) == ['endlistdevices']
+    assert not parser.pending()
+
+
+def test_buffer_reuse():
+    parser = protocol.ResponseParser(size=64)
+    for i in range(1000):
+        data = f'state,3:{i % 3 + 1},{i % 2}\r'.encode('ascii')
+        buffer = parser.get_buffer(len(data))
+        buffer[:len(data)] = data
+        parser.buffer_updated(len(data))
+        assert texts(parser) == [data[:-1].decode('ascii')]
+
+
+def test_long_response():
+    parser = protocol.ResponseParser(size=16)
+    text = 'sendir,' + ','.join(['21'] * 200)
+    data = text.encode('ascii') + b'\r'
+    for i in range(0, len(data), 10):
+        parser.feed(data[i:i+10])
+    assert texts(parser) == [text]
+
+
+def test_kind():
+    kinds = [protocol.Response(text).kind
+             for text in ('state,3:1,1', 'unknowncommand 13', 'ERR_1:1,008', 'endlistdevices')]
+    assert kinds == ['state', 'unknowncommand', 'ERR_1:1', 'endlistdevices']
+
+
+def test_remainder():
+    parser = protocol.ResponseParser()
+    parser.feed(b'state,3:1,1\rstate,3')
+    assert texts(parser) == ['state,3:1,1']
+    assert parser.remainder() == 'state,3'
+    assert not parser.pending()
@@ -0,0 +1,123 @@
+"""Tests of deadlines, retries and the circuit breaker (gc_100.core, gc_100.circuit)"""
+
+import asyncio
+import time
+
+import gc_100
+from gc_100 import circuit
+from gc_100.circuit import CircuitBreaker
+
+# No test should take nearly this long (seconds).
+TIMEOUT = 10
+
+
+def run(test, answer):
+    """Run coroutine function 'test(port)' against a command port server.
+
+    'answer(n, line)' returns the response to the n'th request (counting
+    from 1, over all connections), or None to ignore it, or False to close the
+    connection.
+    """
+    async def main():
+        count = 0
+
+        async def client(r, w):
+            nonlocal count
+            while True:
+                try:
+                    line = await r.readuntil(b'\r')
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                count += 1
+                response = answer(count, line[:-1].decode('ascii'))
+                if response is False:
+                    w.close()
+                    return
+                if response is not None:
+                    w.write(response.encode('ascii') + b'\r')
+
+        server = await asyncio.start_server(client, '127.0.0.1', 0)
+        try:
+            await test(server.sockets[0].getsockname()[1])
+        finally:
+            server.close()
+    asyncio.run(asyncio.wait_for(main(), TIMEOUT))
+
+
+def state(line):
+    return f"state,{line.split(',')[1]},0"
+
+
+def test_retry_idempotent():
+    async def test(port):
+        gc = gc_100.GC100('127.0.0.1', port, retry_backoff=0.01)
+        # the first attempt's connection is dropped
+        assert await gc.getstate('3:1') == 'state,3:1,0'
+        try:
+            await gc.setstate('3:1', True)
+        except gc_100.ConnectionLost:
+            pass
+        else:
+            assert False, "setstate was retried"
+    run(test, lambda n, line: False if n in (1, 3) else state(line))
+
+
+def test_timeouts():
+    async def test(port):
+        gc = gc_100.GC100('127.0.0.1', port, persistent=True, timeout=0.2, retries=0)
+        try:
+            t_start = time.monotonic()
+            try:
+                await gc.getstate('3:1')
+            except gc_100.CommandTimeout as e:
+                assert isinstance(e, TimeoutError)
+            else:
+                assert False, "no timeout"
+            assert 0.2 <= time.monotonic() - t_start < 0.5
+            with gc_100.deadline(0.05):
+                t_start = time.monotonic()
+                try:
+                    await gc.getstate('3:2')
+                except gc_100.CommandTimeout:
+                    pass
+                assert time.monotonic() - t_start < 0.15
+        finally:
+            await gc.close()
+    run(test, lambda n, line: None)
+
+
+def test_breaker():
+    async def test(port):
+        breaker = CircuitBreaker(threshold=2, reset_timeout=0.2)
+        gc = gc_100.GC100('127.0.0.1', port, persistent=True, timeout=0.05, retries=0,
+                          breaker=breaker)
+        try:
+            errors = []
+            for addr in ('3:1', '3:2', '3:3'):
+                try:
+                    await gc.getstate(addr)
+                except gc_100.core.Error as e:
+                    errors.append(type(e))
+            assert errors == [gc_100.CommandTimeout, gc_100.CommandTimeout, gc_100.Unavailable]
+            assert breaker.state == circuit.OPEN and breaker.trips == 1
+            await asyncio.sleep(0.2)
+            # a trial request closes it again
+            assert await gc.getstate('5:1') == 'state,5:1,0'
+            assert breaker.state == circuit.CLOSED
+        finally:
+            await gc.close()
+    run(test, lambda n, line: None if n <= 2 else state(line))
+
+
+def test_breaker_states():
+    breaker = CircuitBreaker(threshold=2, reset_timeout=0.05)
+    breaker.failure()
+    assert breaker.allow() and breaker.state == circuit.CLOSED
+    breaker.failure()
+    assert not breaker.allow() and breaker.state == circuit.OPEN
+    assert 0 < breaker.retry_after() <= 0.05
+    time.sleep(0.05)
+    # one trial at a time; a failed trial opens it again
+    assert breaker.allow() and not breaker.allow()
+    breaker.failure()
+    assert breaker.state == circuit.OPEN and breaker.trips == 1
@@ -0,0 +1,125 @@
+"""Tests of shared and bridged serial ports (gc_100.broker, gc_100.bridge)"""
+
+import asyncio
+import os
+
+import gc_100
+from gc_100 import broker, framing
+from gc_100.bridge import Bridge
+from gc_100.broker import SerialBroker
+from gc_100.simulator import Simulator
+
+# No test should take nearly this long (seconds).
+TIMEOUT = 10
+
+
+def run(test, host):
+    """Run coroutine function 'test(sim, serial)' with a simulated serial port.
+
+    The serial port numbers are fixed (4999 and up), so each test uses its own 'host'.
+    The simulator echoes serial data back, unless given an 'on_serial' callback.
+    """
+    async def main():
+        async with Simulator(host=host, port=0, layout=('SERIAL', 'RELAY')) as sim:
+            gc = gc_100.GC100(sim.host, sim.port)
+            await test(sim, gc_100.Serial(gc, '1:1', 0))
+    asyncio.run(asyncio.wait_for(main(), TIMEOUT))
+
+
+async def take(subscription, n):
+    items = []
+    async for item in subscription:
+        items.append(item)
+        if len(items) == n:
+            break
+    return items
+
+
+def test_broker():
+    async def test(sim, serial):
+        async with SerialBroker(serial, framer=framing.Delimiter()) as shared:
+            first = shared.subscribe()
+            second = shared.subscribe()
+            await asyncio.gather(first.send(b'one\r'), second.send(b'two\r'))
+            assert await take(first, 2) == [b'one', b'two']
+            assert await take(second, 2) == [b'one', b'two']
+            assert sim.serial_in == 8 and shared.sent == 8 and shared.received == 6
+            # one connection, however many subscribers
+            assert sim.rejected == 0
+            second.close()
+            assert shared.subscribers() == 1
+            assert await take(second, 1) == []
+            await first.send(b'three\r')
+            assert await take(first, 1) == [b'three']
+        assert await take(first, 1) == []
+        assert not serial.is_connected()
+    run(test, '127.0.0.7')
+
+
+def test_broker_policies():
+    async def test(sim, serial):
+        async with SerialBroker(serial, framer=framing.Delimiter()) as shared:
+            oldest = shared.subscribe(maxsize=2, policy=broker.DROP_OLDEST)
+            newest = shared.subscribe(maxsize=2, policy=broker.DROP_NEWEST)
+            await oldest.send(b'1\r2\r3\r4\r')
+            # both are full (and not read) until all 4 have arrived
+            while shared.received < 4:
+                await asyncio.sleep(0.01)
+            assert oldest.dropped == 2 and newest.dropped == 2
+            assert await take(oldest, 2) == [b'3', b'4']
+            assert await take(newest, 2) == [b'1', b'2']
+    run(test, '127.0.0.7')
+
+
+async def until(condition):
+    while not condition():
+        await asyncio.sleep(0.01)
+
+
+def test_bridge_tcp():
+    async def test(sim, serial):
+        bridge = Bridge(serial, name='1:1', reconnect_delay=0.05)
+        try:
+            host, port = await bridge.serve_tcp()
+            r, w = await asyncio.open_connection(host, port)
+            w.write(b'hello')
+            assert await r.readexactly(5) == b'hello'
+            # one client at a time
+            r2, w2 = await asyncio.open_connection(host, port)
+            assert await r2.read(100) == b''
+            w2.close()
+            w.close()
+            await until(lambda: not bridge.stats()['client'])
+            sim.serial_send(0, b'lost')
+            await until(lambda: bridge.dropped == 4)
+            stats = bridge.stats()
+            assert stats['connected'] and stats['clients'] == 1
+            assert stats['bytes_up'] == 5 and stats['bytes_down'] == 5
+        finally:
+            await bridge.close()
+        assert not serial.is_connected()
+    run(test, '127.0.0.8')
+
+
+def test_bridge_pty():
+    async def test(sim, serial):
+        bridge = Bridge(serial, reconnect_delay=0.05)
+        try:
+            name = await bridge.serve_pty()
+            fd = os.open(name, os.O_RDWR | os.O_NOCTTY)
+            try:
+                await until(lambda: bridge.stats()['connected'])
+                readable = asyncio.Event()
+                loop = asyncio.get_running_loop()
+                loop.add_reader(fd, readable.set)
+                try:
+                    os.write(fd, b'hello')
+                    await readable.wait()
+                    assert os.read(fd, 100) == b'hello'
+                finally:
+                    loop.remove_reader(fd)
+            finally:
+                os.close(fd)
+        finally:
+            await bridge.close()
+    run(test, '127.0.0.8')
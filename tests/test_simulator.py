@@ -0,0 +1,480 @@
+"""Tests against the simulated GC-100 (gc_100.simulator)"""
+
+import asyncio
+import collections
+import threading
+import time
+
+import gc_100
+from gc_100 import messages, protocol, scheduler, session, sync
+from gc_100.macro import Macro, Send, SetState, Wait
+from gc_100.poller import InputPoller
+from gc_100.relay import RelayBank
+from gc_100.send_ir import IR_out
+from gc_100.simulator import Simulator
+
+# Like the default GC-100-12, but with relays in place of the serial modules
+# (so that no fixed serial ports are needed): IR on modules 3 and 4, relays on 5.
+LAYOUT = ('RELAY', 'RELAY', 'IR', 'IR', 'RELAY')
+
+# IR codes taking about 0.1 s and 0.5 s at 40 kHz.
+SHORT = '1,3999'
+LONG = '1,19999'
+
+
+# No test should take nearly this long (seconds).
+TIMEOUT = 10
+
+
+def run(test, **kwargs):
+    """Run coroutine function 'test(sim)' against a fresh simulator."""
+    async def main():
+        async with Simulator(host='127.0.0.1', port=0, layout=LAYOUT, **kwargs) as sim:
+            await test(sim)
+    run_async(main())
+
+
+def run_async(coroutine):
+    """Run 'coroutine', failing (rather than hanging) if it takes too long."""
+    asyncio.run(asyncio.wait_for(coroutine, TIMEOUT))
+
+
+def test_completeir_correlation():
+    async def test(sim):
+        gc = gc_100.GC100(sim.host, sim.port, persistent=True)
+        try:
+            slow = asyncio.ensure_future(gc.sendir('3:1', 40000, LONG, id=7))
+            fast = asyncio.ensure_future(gc.sendir('3:2', 40000, SHORT, id=7))
+            state = await gc.getstate('5:1')
+            done, pending = await asyncio.wait([slow, fast], return_when=asyncio.FIRST_COMPLETED)
+            assert done == {fast}
+            assert fast.result() == 'completeir,3:2,7'
+            assert await slow == 'completeir,3:1,7'
+            assert state == 'state,5:1,0'
+        finally:
+            await gc.close()
+    run(test)
+
+
+def test_fragmented_responses():
+    async def test(sim):
+        for persistent in (False, True):
+            gc = gc_100.GC100(sim.host, sim.port, persistent=persistent)
+            try:
+                devices = await gc.getdevices()
+                assert [gc.parse_device(device)['type'].split()[-1] for device in devices] == list(LAYOUT)
+                assert await gc.getstate('5:1') == 'state,5:1,0'
+            finally:
+                await gc.close()
+    run(test, fragment=3)
+
+
+def test_cached_rejection():
+    async def test(sim):
+        gc = gc_100.GC100(sim.host, sim.port, persistent=True, cache_ttl=60)
+        try:
+            await gc.getdevices()
+            await gc.get_IR('4:1')
+            commands = sim.commands
+            # known to fail: rejected without asking the GC-100
+            for request, errno in ((gc.setstate('3:1', True), 11),
+                                   (gc.sendir('5:1', 40000, SHORT), 21),
+                                   (gc.getstate('4:1'), 13)):
+                try:
+                    await request
+                except gc_100.CommandError as e:
+                    assert e.errno == errno
+                else:
+                    assert False, "not rejected"
+            await gc.getdevices()
+            await gc.get_IR('4:1')
+            assert sim.commands == commands
+            # setting the mode forgets the cached one
+            await gc.set_IR('4:1', 'SENSOR')
+            assert await gc.getstate('4:1') == 'state,4:1,0'
+        finally:
+            await gc.close()
+    run(test)
+
+
+def test_error_routing():
+    async def test(sim):
+        gc = gc_100.GC100(sim.host, sim.port, persistent=True)
+        try:
+            ir = asyncio.ensure_future(gc.sendir('3:1', 40000, LONG, id=1))
+            # 4:1 is in IR mode (error 13); the offset is even (error 8)
+            state = asyncio.ensure_future(gc.getstate('4:1'))
+            bad = asyncio.ensure_future(gc.raw_request(b'sendir,3:2,2,40000,1,2,1,3999\r'))
+            errors = await asyncio.gather(state, bad, return_exceptions=True)
+            assert [e.errno for e in errors] == [13, 8]
+            assert not ir.done()
+            assert await ir == 'completeir,3:1,1'
+        finally:
+            await gc.close()
+    run(test, ir_time=0.5)
+
+
+def test_ir_error_routing():
+    async def test():
+        conn = session.Session('127.0.0.1', 0)
+        sent = []
+        for data in (b'sendir,1:1,1,40000,1,1,1,1\r', b'sendir,1:2,1,40000,1,1,1,1\r',
+                     b'getstate,1:3\r'):
+            entry = session._Pending(data, conn._ir_key(data), None)
+            conn._pending.append(entry)
+            if entry.ir_key is not None:
+                conn._ir.setdefault(entry.ir_key, collections.deque()).append(entry)
+            sent.append(entry)
+        first, second, state = sent
+        # an iTach error goes to the 'sendir' for its address
+        conn._dispatch(protocol.Response('ERR_1:2,007'))
+        assert second.future.result() == 'ERR_1:2,007'
+        # ... and the first was accepted: a general error skips it
+        conn._dispatch(protocol.Response('ERR_1:3,003'))
+        assert state.future.result() == 'ERR_1:3,003'
+        assert not first.future.done()
+        conn._dispatch(protocol.Response('completeir,1:1,1'))
+        assert first.future.result() == 'completeir,1:1,1'
+    run_async(test())
+
+
+def test_coalescing():
+    async def test(sim):
+        gc = gc_100.GC100(sim.host, sim.port, persistent=True, coalesce_window=10)
+        try:
+            commands = sim.commands
+            states = await asyncio.gather(*(gc.getstate('5:1') for i in range(10)))
+            assert states == ['state,5:1,0'] * 10
+            assert sim.commands == commands + 1
+            # reused within the window...
+            assert await gc.getstate('5:1') == 'state,5:1,0'
+            assert sim.commands == commands + 1
+            # ... until something changes
+            await gc.setstate('5:1', True)
+            assert await gc.getstate('5:1') == 'state,5:1,1'
+            assert sim.commands == commands + 3
+        finally:
+            await gc.close()
+    run(test, latency=0.05)
+
+
+def test_coalesced_deadlines():
+    async def test(sim):
+        for persistent in (False, True):
+            gc = gc_100.GC100(sim.host, sim.port, persistent=persistent)
+            try:
+                async def hurried():
+                    with gc_100.deadline(0.1):
+                        return await gc.getstate('5:1')
+
+                # both share one query; only the hurried caller times out
+                results = await asyncio.gather(hurried(), gc.getstate('5:1'),
+                                               return_exceptions=True)
+                assert type(results[0]) is gc_100.CommandTimeout
+                assert results[1] == 'state,5:1,0'
+            finally:
+                await gc.close()
+    run(test, latency=0.3)
+
+
+def test_abandoned_query():
+    async def test():
+        requests = []
+
+        async def client(r, w):
+            # ignore the first request; answer the rest
+            while True:
+                try:
+                    line = await r.readuntil(b'\r')
+                except asyncio.IncompleteReadError:
+                    return
+                requests.append(line)
+                if len(requests) > 1:
+                    w.write(b'state,' + line[9:-1] + b',0\r')
+
+        server = await asyncio.start_server(client, '127.0.0.1', 0)
+        gc = gc_100.GC100('127.0.0.1', server.sockets[0].getsockname()[1], persistent=True,
+                          retries=0)
+        try:
+            try:
+                await gc.raw_request(b'getstate,3:1\r', timeout=0.1)
+            except gc_100.CommandTimeout:
+                pass
+            else:
+                assert False, "no timeout"
+            # nobody is waiting for 3:1 now, so its answer isn't expected
+            assert await gc.getstate('3:2') == 'state,3:2,0'
+        finally:
+            await gc.close()
+            server.close()
+    run_async(test())
+
+
+def test_serial_without_command_port():
+    async def test():
+        received = asyncio.Queue()
+
+        async def client(r, w):
+            received.put_nowait(await r.read(100))
+
+        # a serial port (4999), but no command port
+        server = await asyncio.start_server(client, '127.0.0.5', gc_100.serial.BASE_PORT)
+        gc = gc_100.GC100('127.0.0.5', retries=0)
+        port = gc_100.Serial(gc, '1:1', 0)
+        try:
+            await port.connect()
+            await port.send(b'hello')
+            await port.flush()
+            assert await received.get() == b'hello'
+        finally:
+            await port.disconnect()
+            server.close()
+    run_async(test())
+
+
+def test_pool():
+    async def test(sim):
+        gc = gc_100.GC100(sim.host, sim.port, persistent=True, connections=3)
+        try:
+            pool = gc._session
+            assert await gc.getstate('5:1') == 'state,5:1,0'
+            # the first connection is used (and kept) first
+            assert pool.size() == 1 and pool.is_open()
+            await gc.getstate('5:2')
+            assert sim.connections == 1
+            # a burst spreads over the connections, and no more
+            await asyncio.gather(*(gc.setstate(f'5:{port}', True) for port in (1, 2, 3) * 3))
+            assert pool.size() == 3 and sim.connections == 3
+        finally:
+            await gc.close()
+    run(test)
+
+
+def test_input_poller():
+    async def test(sim):
+        gc = gc_100.GC100(sim.host, sim.port, persistent=True)
+        poller = InputPoller(rate=100, min_interval=0.02, max_interval=0.2, backoff=2)
+        try:
+            async with poller:
+                changes = poller.subscribe(gc)
+                poller.add(gc, '4:1')
+                poller.add(gc, '4:2')
+                first = {(await changes.__anext__())['addr'] for i in range(2)}
+                assert first == {'4:1', '4:2'}
+                # unchanged inputs slow down
+                await asyncio.sleep(0.5)
+                assert poller.interval(gc, '4:1') == 0.2
+                sim.set_input('4:1', 1)
+                assert await changes.__anext__() == {'addr': '4:1', 'state': 1}
+                assert poller.interval(gc, '4:1') < 0.1
+                # the first poll after a change is soon; no more than 'rate' in all
+                polls = poller.polls
+                await asyncio.sleep(0.5)
+                assert poller.errors == 0 and poller.polls - polls <= 0.5 * 100 + 1
+        finally:
+            await gc.close()
+    run(test, modes={'4:1': 'SENSOR', '4:2': 'SENSOR'})
+
+
+def test_relay_bank():
+    async def test(sim):
+        gc = gc_100.GC100(sim.host, sim.port, persistent=True)
+        bank = RelayBank(gc)
+        try:
+            # on/off/on in quick succession sends only 'on'
+            states = await asyncio.gather(bank.setstate('5:1', True), bank.setstate('5:1', False),
+                                          bank.setstate('5:1', True))
+            assert states == [1, 1, 1] and bank.writes == 1
+            assert await bank.setstate('5:1', True) == 1
+            assert bank.writes == 1
+            assert await bank.apply({'5:1': False, '5:2': True, '5:3': True}) == \
+                {'5:1': 0, '5:2': 1, '5:3': 1}
+            assert (sim.get_input('5:1'), sim.get_input('5:2')) == (0, 1)
+            # (e.g.) the unit restarted: reconnecting puts them back
+            sim.set_input('5:2', 0)
+            for w in list(sim._clients):
+                w.close()
+            await gc._session.wait_closed()
+            await gc.getversion(0)
+            await bank._reconciling
+            assert (sim.get_input('5:2'), bank.state('5:2')) == (1, 1)
+        finally:
+            bank.close()
+            await gc.close()
+    run(test, latency=0.05)
+
+
+def test_macro_cancel_stops_ir():
+    async def test(sim):
+        gc = gc_100.GC100(sim.host, sim.port, persistent=True)
+        stopped = []
+        stopir = gc.stopir
+        async def record(addr):
+            stopped.append(addr)
+            return await stopir(addr)
+        gc.stopir = record
+        try:
+            macro = Macro(gc, [SetState('5:1', True), Wait(0.05), Send('3:1', 40000, LONG)])
+            macro.start()
+            await asyncio.sleep(0.2)
+            assert macro.is_running()
+            await macro.cancel()
+            assert stopped == ['3:1']
+            assert await gc.getstate('5:1') == 'state,5:1,1'
+        finally:
+            await gc.close()
+    run(test)
+
+
+def test_hold():
+    async def test(sim):
+        gc = gc_100.GC100(sim.host, sim.port, persistent=True)
+        try:
+            async with IR_out(gc, '3:1').hold(40000, LONG) as held:
+                await asyncio.sleep(0.1)
+                assert held.is_held()
+            assert not held.is_held()
+            assert held.sent == 1
+            # 4:2 is a sensor input: the error comes out of 'release()'
+            held = await IR_out(gc, '4:2').start_hold(40000, LONG)
+            await asyncio.sleep(0.1)
+            assert not held.is_held()
+            try:
+                await held.release()
+            except gc_100.CommandError as e:
+                assert e.errno == 6
+            else:
+                assert False, "release() didn't raise"
+        finally:
+            await gc.close()
+    run(test, modes={'4:2': 'SENSOR'})
+
+
+def test_messages():
+    assert messages.parse('state,4:1,1') == messages.State('state,4:1,1', ['state', '4:1', '1'])
+    change = messages.from_response(protocol.Response('statechange,4:1,0'))
+    assert type(change) is messages.StateChange
+    assert change.as_dict() == {'addr': '4:1', 'state': 0}
+    error = messages.parse('ERR_1:1,008')
+    assert (error.errno, error.addr) == (8, '1:1')
+    assert messages.parse('unknowncommand 13').errno == 13
+    assert type(messages.parse('state,4')) is messages.Message
+
+
+def test_typed_requests():
+    async def test(sim):
+        for persistent in (False, True):
+            gc = gc_100.GC100(sim.host, sim.port, persistent=persistent)
+            try:
+                text, state = await asyncio.gather(gc.getstate('5:1'),
+                                                   gc.getstate('5:1', typed=True))
+                assert text == 'state,5:1,0'
+                assert (type(state), state.addr, state.state) == (messages.State, '5:1', 0)
+                version = await gc.raw_request(b'getversion,0\r', typed=True)
+                assert type(version) is messages.Version
+            finally:
+                await gc.close()
+    run(test)
+
+
+def test_command_latency():
+    async def test(sim):
+        gc = gc_100.GC100(sim.host, sim.port, persistent=True)
+        try:
+            await gc.getversion(0)
+            t_start = time.monotonic()
+            await gc.setstate('5:1', True)
+            fast = time.monotonic() - t_start
+            await gc.getstate('5:1')
+            slow = time.monotonic() - t_start - fast
+            assert fast < 0.1 and slow >= 0.2
+        finally:
+            await gc.close()
+    run(test, latency={'getstate': 0.2})
+
+
+def test_scheduler_priority():
+    async def test():
+        sched = scheduler.Scheduler(concurrency=1)
+        order = []
+
+        async def command(addr, priority):
+            async with sched.slot(addr, priority):
+                order.append(addr)
+                await asyncio.sleep(0.01)
+
+        first = asyncio.ensure_future(command('3:1', scheduler.NORMAL))
+        await asyncio.sleep(0)
+        tasks = [asyncio.ensure_future(command('3:2', scheduler.NORMAL)),
+                 asyncio.ensure_future(command('5:1', scheduler.HIGH)),
+                 asyncio.ensure_future(command('3:3', scheduler.URGENT))]
+        await asyncio.gather(first, *tasks)
+        # URGENT doesn't wait at all; HIGH goes ahead of NORMAL
+        assert order == ['3:1', '3:3', '5:1', '3:2']
+    run_async(test())
+
+
+def test_scheduler_fairness():
+    async def test():
+        sched = scheduler.Scheduler(concurrency=1)
+        order = []
+
+        async def command(addr):
+            async with sched.slot(addr):
+                order.append(addr)
+                await asyncio.sleep(0)
+
+        tasks = [asyncio.ensure_future(command(addr))
+                 for addr in ('3:1', '3:1', '3:1', '3:2', '3:3')]
+        await asyncio.gather(*tasks)
+        # a busy connector takes turns with the others
+        assert order == ['3:1', '3:2', '3:3', '3:1', '3:1']
+    run_async(test())
+
+
+def test_close_ends_subscriptions():
+    async def test(sim):
+        gc = gc_100.GC100(sim.host, sim.port, persistent=True)
+        changes = []
+
+        async def watch():
+            async for change in gc.subscribe('4:1'):
+                changes.append(change)
+
+        watcher = asyncio.ensure_future(watch())
+        await asyncio.sleep(0.1)
+        sim.set_input('4:1', 1)
+        await asyncio.sleep(0.1)
+        await gc.close()
+        await watcher
+        assert changes[-1] == {'addr': '4:1', 'state': 1}
+    run(test, modes={'4:1': 'SENSOR_NOTIFY'})
+
+
+def test_sync_listener():
+    loop = sync.EventLoopThread()
+    sim = Simulator(host='127.0.0.1', port=0, layout=LAYOUT, modes={'4:1': 'SENSOR_NOTIFY'})
+    loop.run(sim.start())
+    try:
+        gc = sync.GC100(sim.host, sim.port, loop=loop, wait=TIMEOUT, timeout=2.0, retries=0)
+        assert gc._obj._timeout == 2.0
+        changes = []
+        changed = threading.Event()
+        def listener(change):
+            changes.append(change)
+            if change['state']:
+                changed.set()
+        sensor = sync.Digital_In(gc, '4:1')
+        sensor.add_listener(listener)
+        assert sensor.getstate() == 'state,4:1,0'
+        loop.call(sim.set_input, '4:1', 1)
+        assert changed.wait(TIMEOUT)
+        assert changes[-1] == {'addr': '4:1', 'state': 1}
+        sensor.remove_listener(listener)
+        with sync.IR_out(gc, '3:1').hold(40000, LONG) as held:
+            assert held.is_held()
+        assert not held.is_held()
+        gc.close()
+    finally:
+        loop.run(sim.stop())
+        loop.stop()